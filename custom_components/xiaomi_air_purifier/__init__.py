@@ -3,7 +3,8 @@ from __future__ import annotations
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
 from homeassistant.core import HomeAssistant
-from .const import DOMAIN
+from homeassistant.helpers.storage import Store
+from .const import DOMAIN, AUTH_STORAGE_KEY, AUTH_STORAGE_VERSION, HISTORY_STORAGE_KEY, HISTORY_STORAGE_VERSION
 from .coordinator import XiaomiAirPurifierDataUpdateCoordinator
 
 PLATFORMS = (
@@ -37,13 +38,19 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
             entry.entry_id
         ]
         coordinator.device.listen(None)
-        coordinator.device.disconnect()
+        await coordinator.async_shutdown()
         del coordinator.device
         del hass.data[DOMAIN][entry.entry_id]
 
     return unload_ok
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove stored cloud session and history backfill progress of the Xiaomi Air Purifier config entry."""
+    await Store(hass, AUTH_STORAGE_VERSION, AUTH_STORAGE_KEY.format(entry.entry_id), private=True).async_remove()
+    await Store(hass, HISTORY_STORAGE_VERSION, HISTORY_STORAGE_KEY.format(entry.entry_id)).async_remove()
+
+
 async def update_listener(hass: HomeAssistant, config_entry: ConfigEntry) -> None:
     """Handle options update."""
     await hass.config_entries.async_reload(config_entry.entry_id)
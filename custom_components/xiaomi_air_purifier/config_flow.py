@@ -21,7 +21,8 @@ from homeassistant.config_entries import (
     OptionsFlow,
 )
 
-from .xiaomi import XiaomiAirPurifierProtocol
+from .xiaomi import XiaomiAirPurifierProtocol, POLL_SCHEDULE
+from .coordinator import async_get_client_session
 
 from .const import (
     DOMAIN,
@@ -29,6 +30,10 @@ from .const import (
     CONF_COUNTRY,
     CONF_MAC,
     CONF_PREFER_CLOUD,
+    CONF_HEDGE_WRITES,
+    CONF_POLL_INTERVALS,
+    CONF_MIN_UPDATE_INTERVAL,
+    CONF_MAX_UPDATE_INTERVAL,
     NOTIFICATION,
     NOTIFICATION_ID_2FA_LOGIN,
     NOTIFICATION_2FA_LOGIN,
@@ -46,6 +51,7 @@ class XiaomiAirPurifierOptionsFlowHandler(OptionsFlow):
     def __init__(self, config_entry: ConfigEntry) -> None:
         """Initialize Xiaomi Air Purifier options flow."""
         self.config_entry = config_entry
+        self.options: dict[str, Any] = {}
 
     async def async_step_init(
         self, user_input: dict[str, Any] | None = None
@@ -56,7 +62,8 @@ class XiaomiAirPurifierOptionsFlowHandler(OptionsFlow):
         options = self.config_entry.options
 
         if user_input is not None:
-            return self.async_create_entry(title="", data={**options, **user_input})
+            self.options = {**options, **user_input}
+            return await self.async_step_schedule()
         
         notify = options[CONF_NOTIFY]
         if isinstance(notify, bool):
@@ -72,6 +79,7 @@ class XiaomiAirPurifierOptionsFlowHandler(OptionsFlow):
             data_schema = data_schema.extend(
                 {
                     vol.Required(CONF_PREFER_CLOUD, default=options.get(CONF_PREFER_CLOUD, False)): bool,
+                    vol.Required(CONF_HEDGE_WRITES, default=options.get(CONF_HEDGE_WRITES, False)): bool,
                 }
             )
 
@@ -81,6 +89,47 @@ class XiaomiAirPurifierOptionsFlowHandler(OptionsFlow):
             errors=errors,
         )
 
+    async def async_step_schedule(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Manage update interval of the device and polling intervals of the device properties."""
+        errors = {}
+        if user_input is not None:
+            min_update_interval = user_input.pop(CONF_MIN_UPDATE_INTERVAL)
+            max_update_interval = user_input.pop(CONF_MAX_UPDATE_INTERVAL)
+            if max_update_interval < min_update_interval:
+                errors["base"] = "invalid_update_interval"
+            else:
+                return self.async_create_entry(
+                    title="",
+                    data={
+                        **self.options,
+                        CONF_MIN_UPDATE_INTERVAL: min_update_interval,
+                        CONF_MAX_UPDATE_INTERVAL: max_update_interval,
+                        CONF_POLL_INTERVALS: user_input,
+                    },
+                )
+
+        intervals = self.options.get(CONF_POLL_INTERVALS, {})
+        data_schema = vol.Schema(
+            {
+                vol.Required(CONF_MIN_UPDATE_INTERVAL, default=self.options.get(CONF_MIN_UPDATE_INTERVAL, 3)): vol.All(
+                    vol.Coerce(int), vol.Range(min=1, max=3600)
+                ),
+                vol.Required(CONF_MAX_UPDATE_INTERVAL, default=self.options.get(CONF_MAX_UPDATE_INTERVAL, 15)): vol.All(
+                    vol.Coerce(int), vol.Range(min=1, max=3600)
+                ),
+                **{
+                    vol.Required(prop.name.lower(), default=int(intervals.get(prop.name.lower(), rule.interval))): vol.All(
+                        vol.Coerce(int), vol.Range(min=0, max=86400)
+                    )
+                    for prop, rule in POLL_SCHEDULE.items()
+                },
+            }
+        )
+
+        return self.async_show_form(step_id="schedule", data_schema=data_schema, errors=errors)
+
 
 class XiaomiAirPurifierFlowHandler(ConfigFlow, domain=DOMAIN):
     """Handle config flow for an Xiaomi Air Purifier device."""
@@ -111,6 +160,13 @@ class XiaomiAirPurifierFlowHandler(ConfigFlow, domain=DOMAIN):
         """Get the options flow for this handler."""
         return XiaomiAirPurifierOptionsFlowHandler(config_entry)
 
+    @callback
+    def async_remove(self) -> None:
+        """Release the cloud session of the flow when it is removed."""
+        if self.protocol is not None:
+            self.hass.async_create_task(self.protocol.disconnect())
+            self.protocol = None
+
     async def async_step_user(
         self, user_input: dict[str, Any] | None = None
     ) -> FlowResult:
@@ -144,14 +200,17 @@ class XiaomiAirPurifierFlowHandler(ConfigFlow, domain=DOMAIN):
         if len(self.token) == 32:
             try:
                 if self.protocol is None:
-                    self.protocol = XiaomiAirPurifierProtocol(self.host, self.token, self.username, self.password, self.country, self.prefer_cloud)                
+                    self.protocol = XiaomiAirPurifierProtocol(self.host, self.token, self.username, self.password, self.country, self.prefer_cloud, session=async_get_client_session(self.hass))
                 else:
                     self.protocol.set_credentials(self.host, self.token)
 
                 if self.protocol.device_cloud:
                     self.protocol.device_cloud.device_id = self.device_id
 
-                info = await self.hass.async_add_executor_job(self.protocol.connect, 5)
+                try:
+                    info = await self.protocol.connect(5)
+                finally:
+                    await self.protocol.disconnect()
                 if info:
                     self.mac = info["mac"]
                     self.model = info["model"]
@@ -227,8 +286,10 @@ class XiaomiAirPurifierFlowHandler(ConfigFlow, domain=DOMAIN):
                 self.country = country
                 self.prefer_cloud = user_input.get(CONF_PREFER_CLOUD, False)
 
-                self.protocol = XiaomiAirPurifierProtocol(username=self.username, password=self.password, country=self.country, prefer_cloud=self.prefer_cloud)
-                await self.hass.async_add_executor_job(self.protocol.cloud.login)
+                if self.protocol is not None:
+                    await self.protocol.disconnect()
+                self.protocol = XiaomiAirPurifierProtocol(username=self.username, password=self.password, country=self.country, prefer_cloud=self.prefer_cloud, session=async_get_client_session(self.hass))
+                await self.protocol.cloud.login()
 
                 if self.protocol.cloud.two_factor_url is not None:
                     errors["base"] = "2fa_required"
@@ -244,9 +305,7 @@ class XiaomiAirPurifierFlowHandler(ConfigFlow, domain=DOMAIN):
                 elif self.protocol.cloud.logged_in:
                     persistent_notification.dismiss(self.hass, f'{DOMAIN}_{NOTIFICATION_ID_2FA_LOGIN}')
 
-                    devices = await self.hass.async_add_executor_job(
-                        self.protocol.cloud.get_devices
-                    )
+                    devices = await self.protocol.cloud.get_devices()
                     if devices:
                         found = list(
                             filter(
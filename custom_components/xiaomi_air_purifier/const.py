@@ -13,6 +13,23 @@ CONF_COUNTRY: Final = "country"
 CONF_MANUAL: Final = "manual"
 CONF_MAC: Final = "mac"
 CONF_PREFER_CLOUD: Final = "prefer_cloud"
+CONF_HEDGE_WRITES: Final = "hedge_writes"
+CONF_POLL_INTERVALS: Final = "poll_intervals"
+CONF_MIN_UPDATE_INTERVAL: Final = "min_update_interval"
+CONF_MAX_UPDATE_INTERVAL: Final = "max_update_interval"
+
+AUTH_STORAGE_KEY: Final = DOMAIN + ".{}.auth"
+AUTH_STORAGE_VERSION: Final = 1
+
+HISTORY_STORAGE_KEY: Final = DOMAIN + ".{}.history"
+HISTORY_STORAGE_VERSION: Final = 1
+HISTORY_BACKFILL_MAX_AGE: Final = 7 * 24 * 3600  # Oldest cloud history that is imported in seconds
+
+CAPABILITY_STORAGE_KEY: Final = DOMAIN + ".capabilities"
+CAPABILITY_STORAGE_VERSION: Final = 1
+
+DATA_CLIENT_SESSION: Final = DOMAIN + "_client_session"
+DATA_CAPABILITY_STORE: Final = DOMAIN + "_capability_store"
 
 SERVICE_RESET_FILTER = "fan_reset_filter"
 SERVICE_TOGGLE_POWER = "fan_toggle_power"
@@ -3,6 +3,8 @@ from __future__ import annotations
 
 import math
 import traceback
+from typing import Any
+from aiohttp import ClientSession, DummyCookieJar
 from homeassistant.components import persistent_notification
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import (
@@ -13,18 +15,74 @@ from homeassistant.const import (
     CONF_USERNAME
 )
 from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.aiohttp_client import async_create_clientsession
 from homeassistant.helpers.entity import generate_entity_id
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
-from .xiaomi import XiaomiAirPurifierDevice, XiaomiAirPurifierProperty
+from .xiaomi import (
+    XiaomiAirPurifierDevice,
+    XiaomiAirPurifierProperty,
+    XiaomiAirPurifierCapabilities,
+    XiaomiAirPurifierBatchSize,
+)
+from .history import XiaomiAirPurifierHistoryBackfill
 from .const import (
     DOMAIN,
     LOGGER,
     CONF_COUNTRY,
     CONF_MAC,
-    CONF_PREFER_CLOUD
+    CONF_PREFER_CLOUD,
+    CONF_HEDGE_WRITES,
+    CONF_POLL_INTERVALS,
+    CONF_MIN_UPDATE_INTERVAL,
+    CONF_MAX_UPDATE_INTERVAL,
+    AUTH_STORAGE_KEY,
+    AUTH_STORAGE_VERSION,
+    CAPABILITY_STORAGE_KEY,
+    CAPABILITY_STORAGE_VERSION,
+    DATA_CLIENT_SESSION,
+    DATA_CAPABILITY_STORE,
 )
 
 
+@callback
+def async_get_client_session(hass: HomeAssistant) -> ClientSession:
+    """Client session for cloud requests of all entries and flows.
+
+    Requests share the connection pool of Home Assistant and cookies are sent explicitly by the protocol.
+    Session is not owned by an entry because cloud sessions of an account outlive the entry that created them.
+    """
+    if DATA_CLIENT_SESSION not in hass.data:
+        hass.data[DATA_CLIENT_SESSION] = async_create_clientsession(hass, cookie_jar=DummyCookieJar())
+    return hass.data[DATA_CLIENT_SESSION]
+
+
+async def async_load_capabilities(hass: HomeAssistant) -> Store:
+    """Load the learned capabilities of the devices once and return the shared store.
+
+    Capabilities and batch sizes are stored by model and firmware version so they are shared by all entries.
+    """
+    if DATA_CAPABILITY_STORE not in hass.data:
+        store = Store(hass, CAPABILITY_STORAGE_VERSION, CAPABILITY_STORAGE_KEY)
+        hass.data[DATA_CAPABILITY_STORE] = store
+        data = await store.async_load()
+        if isinstance(data, list):
+            # Stored by a previous version without the batch sizes
+            data = {"properties": data}
+        elif not isinstance(data, dict):
+            data = {}
+        XiaomiAirPurifierCapabilities.restore(data.get("properties"))
+        XiaomiAirPurifierBatchSize.restore(data.get("batch_sizes"))
+    return hass.data[DATA_CAPABILITY_STORE]
+
+
+def _dump_capabilities() -> dict[str, Any]:
+    return {
+        "properties": XiaomiAirPurifierCapabilities.dump(),
+        "batch_sizes": XiaomiAirPurifierBatchSize.dump(),
+    }
+
+
 class XiaomiAirPurifierDataUpdateCoordinator(DataUpdateCoordinator[XiaomiAirPurifierDevice]):
     """Class to manage fetching Xiaomi Air Purifier data from single endpoint."""
 
@@ -41,6 +99,12 @@ class XiaomiAirPurifierDataUpdateCoordinator(DataUpdateCoordinator[XiaomiAirPuri
         self._host = entry.data[CONF_HOST]
         self._entry = entry
         self._available = False
+        self._session = async_get_client_session(hass)
+        # Cloud session tokens are kept between restarts so the integration does not need to login on every start
+        self._auth_store = Store(hass, AUTH_STORAGE_VERSION, AUTH_STORAGE_KEY.format(entry.entry_id), private=True)
+        self._auth = None
+        self._auth_loaded = False
+        self._capability_store: Store = None
 
         self.device = XiaomiAirPurifierDevice(
             entry.data[CONF_NAME],
@@ -51,10 +115,23 @@ class XiaomiAirPurifierDataUpdateCoordinator(DataUpdateCoordinator[XiaomiAirPuri
             entry.data.get(CONF_PASSWORD),
             entry.data.get(CONF_COUNTRY),
             entry.options.get(CONF_PREFER_CLOUD, False),
+            session=self._session,
+            hedge_writes=entry.options.get(CONF_HEDGE_WRITES, False),
+            poll_intervals=entry.options.get(CONF_POLL_INTERVALS),
+            min_update_interval=entry.options.get(CONF_MIN_UPDATE_INTERVAL, 3),
+            max_update_interval=entry.options.get(CONF_MAX_UPDATE_INTERVAL, 15),
         )        
      
+        # Sensor statistics of the time device could not be polled are imported from the cloud history
+        self._history = (
+            XiaomiAirPurifierHistoryBackfill(hass, entry.entry_id, self.device)
+            if entry.data.get(CONF_USERNAME)
+            else None
+        )
+
         self.device.listen(self.async_set_updated_data)
         self.device.listen_error(self.async_set_update_error)
+        self.device.listen_poll(self._async_device_polled)
 
         super().__init__(
             hass,
@@ -65,7 +142,14 @@ class XiaomiAirPurifierDataUpdateCoordinator(DataUpdateCoordinator[XiaomiAirPuri
     async def _async_update_data(self) -> XiaomiAirPurifierDevice:
         """Handle device update. This function is only called once when the integration is added to Home Assistant."""
         try:
-            await self.hass.async_add_executor_job(self.device.update)
+            if not self._auth_loaded:
+                self._auth_loaded = True
+                self._auth = await self._auth_store.async_load()
+                self.device.restore_cloud_auth(self._auth)
+                self._capability_store = await async_load_capabilities(self.hass)
+                if self._history:
+                    await self._history.async_load()
+            await self.device.update()
             self.device.schedule_update()
             self.async_set_updated_data()
             return self.device
@@ -73,6 +157,13 @@ class XiaomiAirPurifierDataUpdateCoordinator(DataUpdateCoordinator[XiaomiAirPuri
             LOGGER.error("Update failed: %s", traceback.format_exc())
             raise UpdateFailed(ex) from ex
 
+    async def async_shutdown(self) -> None:
+        """Disconnect from the device and release its cloud session."""
+        await super().async_shutdown()
+        if self._history:
+            await self._history.async_stop()
+        await self.device.disconnect()
+
     @callback
     def async_set_updated_data(self, device=None) -> None:
         if self.device.token != self._token or self.device.host != self._host:
@@ -83,10 +174,23 @@ class XiaomiAirPurifierDataUpdateCoordinator(DataUpdateCoordinator[XiaomiAirPuri
             data[CONF_TOKEN] = self._token
             self.hass.config_entries.async_update_entry(self._entry, data=data)
 
-        self._available = self.device.available
+        auth = self.device.cloud_auth
+        if auth and auth != self._auth:
+            self._auth = auth
+            self._auth_store.async_delay_save(lambda: self._auth, 1)
 
+        if (XiaomiAirPurifierCapabilities.changed or XiaomiAirPurifierBatchSize.changed) and self._capability_store:
+            self._capability_store.async_delay_save(_dump_capabilities, 1)
+
+        self._available = self.device.available
         super().async_set_updated_data(self.device)
 
+    @callback
+    def _async_device_polled(self) -> None:
+        # Device is seen on every successful poll, listeners are only called when a value is changed
+        if self._history:
+            self._history.async_seen()
+
     @callback
     def async_set_update_error(self, ex) -> None:
         if self._available:
@@ -3,7 +3,6 @@ from __future__ import annotations
 from typing import Any, Dict
 from dataclasses import dataclass
 from collections.abc import Callable
-from functools import partial
 
 from homeassistant.core import callback
 from homeassistant.helpers.device_registry import CONNECTION_NETWORK_MAC
@@ -50,6 +49,8 @@ class XiaomiAirPurifierEntityDescription:
     icon_fn: Callable[[str, object], str] = None
     unit_fn: Callable[[str, object], str] = None
     attrs_fn: Callable[[object, Dict]] = None
+    # Other properties that are read by the functions of the entity and requested with the property of the entity
+    extra_property_keys: tuple[XiaomiAirPurifierProperty, ...] = ()
 
 
 class XiaomiAirPurifierEntity(CoordinatorEntity[XiaomiAirPurifierDataUpdateCoordinator]):
@@ -109,6 +110,26 @@ class XiaomiAirPurifierEntity(CoordinatorEntity[XiaomiAirPurifierDataUpdateCoord
             self._attr_name = f"{self.device.name} {self.entity_description.name}"
             self._attr_unique_id = f"{self.device.mac}_{self.entity_description.key}"            
 
+    async def async_added_to_hass(self) -> None:
+        """Subscribe to the properties of the entity so they are requested on device updates."""
+        await super().async_added_to_hass()
+        for prop in self._subscribed_properties:
+            self.device.subscribe(prop)
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Unsubscribe from the properties when the entity is disabled or removed."""
+        for prop in self._subscribed_properties:
+            self.device.unsubscribe(prop)
+        await super().async_will_remove_from_hass()
+
+    @property
+    def _subscribed_properties(self) -> list[XiaomiAirPurifierProperty]:
+        """Device properties that are shown by the entity."""
+        properties = list(self.entity_description.extra_property_keys)
+        if self.entity_description.property_key is not None:
+            properties.insert(0, self.entity_description.property_key)
+        return properties
+
     @callback
     def _handle_coordinator_update(self) -> None:
         if self.entity_description.icon_fn is not None:
@@ -124,7 +145,7 @@ class XiaomiAirPurifierEntity(CoordinatorEntity[XiaomiAirPurifierDataUpdateCoord
     async def _try_command(self, mask_error, func, *args, **kwargs) -> bool:
         """Call a vacuum command handling error messages."""
         try:
-            await self.hass.async_add_executor_job(partial(func, *args, **kwargs))
+            await func(*args, **kwargs)
             return True
         except (InvalidActionException, InvalidValueException) as exc:
             LOGGER.error(mask_error, exc)
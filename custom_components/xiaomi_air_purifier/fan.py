@@ -25,7 +25,7 @@ from .const import (
     SERVICE_TOGGLE_FAN_LEVEL
 )
 
-from .xiaomi import XiaomiAirPurifierMode, XiaomiAirPurifierFanLevel
+from .xiaomi import XiaomiAirPurifierMode, XiaomiAirPurifierFanLevel, XiaomiAirPurifierProperty
 
 FAN_LEVEL_TO_FAN_SPEED: Final = {
     XiaomiAirPurifierFanLevel.HIGH: "High",
@@ -88,6 +88,10 @@ class XiaomiAirPurifier(XiaomiAirPurifierEntity, FanEntity):
         self._attr_unique_id = f"{coordinator.device.mac}_" + DOMAIN
         self._set_attrs()
 
+    @property
+    def _subscribed_properties(self) -> list[XiaomiAirPurifierProperty]:
+        return self.device.status.attribute_properties
+
     @callback
     def _handle_coordinator_update(self) -> None:
         self._set_attrs()
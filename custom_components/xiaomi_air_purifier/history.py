@@ -0,0 +1,151 @@
+"""Backfill of Xiaomi Air Purifier sensor statistics from the cloud property history."""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any
+
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import async_import_statistics
+from homeassistant.const import ATTR_UNIT_OF_MEASUREMENT, Platform
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    DOMAIN,
+    LOGGER,
+    HISTORY_STORAGE_KEY,
+    HISTORY_STORAGE_VERSION,
+    HISTORY_BACKFILL_MAX_AGE,
+)
+from .xiaomi import XiaomiAirPurifierDevice, XiaomiAirPurifierProperty, DeviceException, PROPERTY_TO_NAME
+
+BACKFILL_PROPERTIES = (
+    XiaomiAirPurifierProperty.PM2_5,
+    XiaomiAirPurifierProperty.HUMIDITY,
+    XiaomiAirPurifierProperty.TEMPERATURE,
+)
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+
+class XiaomiAirPurifierHistoryBackfill:
+    """Imports hourly statistics of the measurement sensors for the time the device could not be polled.
+
+    Only the whole hours of an outage are imported so statistics compiled by the recorder are never replaced.
+    Progress is stored after every imported day and an interrupted backfill continues on next start."""
+
+    def __init__(self, hass: HomeAssistant, entry_id: str, device: XiaomiAirPurifierDevice) -> None:
+        self._hass = hass
+        self._device = device
+        self._store = Store(hass, HISTORY_STORAGE_VERSION, HISTORY_STORAGE_KEY.format(entry_id))
+        self._last_seen: float = None  # Last time the device is polled successfully
+        self._pending: dict[str, int] = None  # Hour aligned window that is not imported yet
+        self._task: asyncio.Task = None
+        self._retry_time: float = 0  # Interrupted backfill is not started again before this time
+
+    async def async_load(self) -> None:
+        """Restore the last seen time and the pending window of the previous run."""
+        data = await self._store.async_load() or {}
+        self._last_seen = data.get("last_seen")
+        self._pending = data.get("pending")
+
+    def _data_to_save(self) -> dict[str, Any]:
+        return {"last_seen": self._last_seen, "pending": self._pending}
+
+    @callback
+    def async_seen(self) -> None:
+        """Mark the device as polled now and start backfilling the gap since the previous successful poll."""
+        now = time.time()
+        if self._last_seen is not None:
+            self._schedule(self._last_seen, now)
+        self._last_seen = now
+        self._store.async_delay_save(self._data_to_save, 60)
+
+    @callback
+    def _schedule(self, gap_start: float, gap_end: float) -> None:
+        start = max(int(gap_start) // HOUR * HOUR + HOUR, int(gap_end) - HISTORY_BACKFILL_MAX_AGE)
+        end = int(gap_end) // HOUR * HOUR
+        if self._pending:
+            start = min(start, self._pending["start"])
+            end = max(end, self._pending["end"])
+
+        if end > start:
+            if self._pending != {"start": start, "end": end}:
+                self._pending = {"start": start, "end": end}
+                self._store.async_delay_save(self._data_to_save, 0)
+
+        if (
+            self._pending
+            and self._task is None
+            and time.time() >= self._retry_time
+            and "recorder" in self._hass.config.components
+        ):
+            self._task = self._hass.async_create_background_task(self._async_backfill(), f"{DOMAIN} history backfill")
+
+    async def _async_backfill(self) -> None:
+        try:
+            entity_registry = er.async_get(self._hass)
+            entities = {}
+            for prop in BACKFILL_PROPERTIES:
+                entity_id = entity_registry.async_get_entity_id(
+                    Platform.SENSOR, DOMAIN, f"{self._device.mac}_{PROPERTY_TO_NAME[prop][0]}"
+                )
+                if entity_id:
+                    entities[prop] = entity_id
+
+            while self._pending:
+                start = self._pending["start"]
+                end = min(start + DAY, self._pending["end"])
+                for prop, entity_id in entities.items():
+                    await self._async_import(prop, entity_id, start, end)
+
+                # Imported day is not requested again when the backfill is interrupted
+                self._pending = {"start": end, "end": self._pending["end"]} if end < self._pending["end"] else None
+                self._store.async_delay_save(self._data_to_save, 0)
+        except DeviceException as ex:
+            LOGGER.warning("History backfill is interrupted: %s", ex)
+            self._retry_time = time.time() + 600
+        finally:
+            self._task = None
+
+    async def _async_import(self, prop: XiaomiAirPurifierProperty, entity_id: str, start: int, end: int) -> None:
+        hours: dict[int, list[float]] = {}
+        async for page in self._device.get_property_history(prop, start, end - 1):
+            for timestamp, value in page:
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    hours.setdefault(timestamp // HOUR * HOUR, []).append(float(value))
+
+        if not hours:
+            return
+
+        state = self._hass.states.get(entity_id)
+        metadata = StatisticMetaData(
+            has_mean=True,
+            has_sum=False,
+            name=None,
+            source="recorder",
+            statistic_id=entity_id,
+            unit_of_measurement=state.attributes.get(ATTR_UNIT_OF_MEASUREMENT) if state else None,
+        )
+        statistics = [
+            StatisticData(
+                start=dt_util.utc_from_timestamp(hour),
+                mean=sum(values) / len(values),
+                min=min(values),
+                max=max(values),
+            )
+            for hour, values in sorted(hours.items())
+        ]
+        LOGGER.info("Importing %s hours of %s history", len(statistics), entity_id)
+        async_import_statistics(self._hass, metadata, statistics)
+
+    async def async_stop(self) -> None:
+        """Cancel the running backfill and store the progress."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self._store.async_save(self._data_to_save())
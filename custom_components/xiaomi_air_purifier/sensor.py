@@ -70,6 +70,7 @@ SENSORS: tuple[XiaomiAirPurifierSensorEntityDescription, ...] = (
     XiaomiAirPurifierSensorEntityDescription(
         property_key=XiaomiAirPurifierProperty.TEMPERATURE,
         unit_fn=lambda value, device: "°C" if device.status.temperature_unit is XiaomiAirPurifierTemperatureUnit.CELCIUS else "°F",
+        extra_property_keys=(XiaomiAirPurifierProperty.TEMPERATURE_UNIT,),
         device_class=SensorDeviceClass.TEMPERATURE,
         state_class=SensorStateClass.MEASUREMENT,
         suggested_display_precision=1,
@@ -169,6 +170,11 @@ SENSORS: tuple[XiaomiAirPurifierSensorEntityDescription, ...] = (
         property_key=XiaomiAirPurifierProperty.RFID_TAG,
         icon="mdi:nfc-variant",
         attrs_fn=lambda device: device.status.rfid,
+        extra_property_keys=(
+            XiaomiAirPurifierProperty.RFID_PRODUCT,
+            XiaomiAirPurifierProperty.RFID_MANUFACTURER,
+            XiaomiAirPurifierProperty.RFID_TIME,
+        ),
         entity_category=EntityCategory.DIAGNOSTIC,
     ),
 )
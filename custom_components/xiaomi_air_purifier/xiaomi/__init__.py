@@ -13,11 +13,18 @@ from .types import (
     XiaomiAirPurifierCoverage,
     PROPERTY_AVAILABILITY,
     ACTION_AVAILABILITY,
+    POLL_SCHEDULE,
 )
 from .const import (
     PROPERTY_TO_NAME,
     ACTION_TO_NAME,
 )
-from .device import XiaomiAirPurifierDevice
+from .device import XiaomiAirPurifierDevice, XiaomiAirPurifierCapabilities, XiaomiAirPurifierBatchSize
 from .protocol import XiaomiAirPurifierProtocol
-from .exceptions import DeviceException, DeviceUpdateFailedException, InvalidActionException, InvalidValueException
+from .exceptions import (
+    DeviceException,
+    DeviceNoResponseException,
+    DeviceUpdateFailedException,
+    InvalidActionException,
+    InvalidValueException,
+)
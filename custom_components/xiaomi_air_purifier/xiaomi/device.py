@@ -1,9 +1,13 @@
 from __future__ import annotations
+import aiohttp
+import asyncio
+import json
 import logging
 import math
+import random
 import time
-from threading import Timer
-from typing import Any, Optional
+from dataclasses import dataclass, replace
+from typing import Any, AsyncIterator, Optional
 
 from .const import PROPERTY_TO_NAME, FAULT_TO_NAME, DOOR_STATUS_TO_NAME, REBOOT_REASON_TO_NAME, COUNTRY_CODE_TO_NAME, AIR_QUALITY_TO_NAME, MODE_TO_NAME, COVERAGE_TO_NAME, FAN_LEVEL_TO_NAME, SCREEN_BRIGHTNESS_TO_NAME, TEMPERATURE_UNIT_TO_NAME, STATE_UNKNOWN
 from .types import (
@@ -20,15 +24,21 @@ from .types import (
     XiaomiAirPurifierFanLevel,
     XiaomiAirPurifierScreenBrightness,
     XiaomiAirPurifierTemperatureUnit,
-    XiaomiAirPurifierCoverage
+    XiaomiAirPurifierCoverage,
+    XiaomiAirPurifierPollRule,
+    POLL_SCHEDULE,
+    POLL_GROUP_SETTINGS,
+    POLL_GROUP_CONSUMABLE,
 )
 
 from .exceptions import (
+    DeviceException,
     DeviceUpdateFailedException,
     InvalidActionException,
     InvalidValueException,
 )
 from .protocol import XiaomiAirPurifierProtocol
+from .scheduler import XiaomiAirPurifierUpdateScheduler
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -51,6 +61,12 @@ class XiaomiAirPurifierDevice:
         password: str = None,
         country: str = None,
         prefer_cloud: bool = False,
+        base_url: str = None,
+        session: aiohttp.ClientSession = None,
+        hedge_writes: bool = False,
+        poll_intervals: dict[str, float] = None,
+        min_update_interval: float = 3,
+        max_update_interval: float = 15,
     ) -> None:
         # Used for easy filtering the device from cloud device list and generating unique ids
         self.mac: str = None
@@ -63,22 +79,31 @@ class XiaomiAirPurifierDevice:
         self._update_running: bool = False  # Update is running
         # Device do not request properties that returned -1 as result. This property used for overriding that behavior at first connection
         self._ready: bool = False
-        # Last settings properties requested time
-        self._last_settings_request: float = 0
-        self._last_consumable_request: float = 0
-        self._last_telemetry_request: float = 0
+        # Properties that are known to be not exist on the model and firmware, they are not requested at first connection
+        self._unsupported: set[int] = set()
+        # Properties that the device answered as not exist on the last request
+        self._not_found: set[int] = set()
+        # Properties that are due on each update, intervals can be overridden by property name
+        self._poll_planner = XiaomiAirPurifierPollPlanner(POLL_SCHEDULE, poll_intervals)
+        # Update interval that follows the change rate of the air quality readings
+        self._adaptive_interval = XiaomiAirPurifierAdaptiveInterval(min_update_interval, max_update_interval)
         self._last_change: float = 0  # Last property change time
         self._last_update_failed: float = 0  # Last update failed time      
         self._update_fail_count: int = 0 # Update failed counter
         # Map Manager object. Only available when cloud connection is present
         self._update_callback = None  # External update callback for device
         self._error_callback = None  # External update failed callback
+        self._poll_callback = None  # External callback of every successful poll, also when no property is changed
         # External update callbacks for specific device property
         self._property_update_callback = {}
-        self._update_timer: Timer = None  # Update schedule timer
-        # Used for requesting consumable properties after reset action otherwise they will only requested when cleaning completed
-        self._consumable_reset: bool = False
+        self._scheduler: XiaomiAirPurifierUpdateScheduler = None  # Shared update scheduler of the event loop
         self._dirty_data: dict[XiaomiAirPurifierProperty, Any] = {}
+        # Learned get_properties batch size, shared with the devices of same model and firmware after connection
+        self._batch_size = XiaomiAirPurifierBatchSize(len(self.property_mapping))
+        # Time and attempt budget of a single properties request
+        self._retry_policy = XiaomiAirPurifierRetryPolicy()
+        # Properties that are failed to be requested on last update and will be requested again on next update
+        self._stale_data: set[int] = set()
 
         self._name = name
         self.mac = mac
@@ -87,7 +112,7 @@ class XiaomiAirPurifierDevice:
         self.two_factor_url = None
         self.status = XiaomiAirPurifierDeviceStatus(self)
 
-        self._protocol = XiaomiAirPurifierProtocol(self.host, self.token, username, password, country, prefer_cloud)
+        self._protocol = XiaomiAirPurifierProtocol(self.host, self.token, username, password, country, prefer_cloud, base_url=base_url, session=session, hedge_writes=hedge_writes)
 
     @staticmethod
     def percentage_to_ranged_value(
@@ -103,7 +128,7 @@ class XiaomiAirPurifierDevice:
         offset = low_high_range[0] - 1
         return int(((value - offset) * 100) // (low_high_range[1] - low_high_range[0] + 1))
 
-    def _request_properties(self, properties: list[XiaomiAirPurifierProperty] = None) -> bool:
+    async def _request_properties(self, properties: list[XiaomiAirPurifierProperty] = None) -> bool:
         """Request properties from the device."""
         if not properties:
             properties = [prop for prop in XiaomiAirPurifierProperty]
@@ -114,21 +139,23 @@ class XiaomiAirPurifierDevice:
                 mapping = self.property_mapping[prop]
                 # Do not include properties that are not exists on the device
                 if "aiid" not in mapping and (
-                    not self._ready or prop.value in self.data
+                    prop.value in self.data if self._ready else prop.value not in self._unsupported
                 ):
                     property_list.append({"did": str(prop.value), **mapping})
 
-        props = property_list.copy()
-        results = []
-        while props:
-            result = self._protocol.get_properties(props[:15])
-            if result is not None:
-                results.extend(result)
-                props[:] = props[15:]
+        results = await self._request_chunks(property_list, self._retry_policy.start())
+        if len(property_list) >= self._batch_size.size and len(results) >= len(property_list):
+            # Updates are capped to the batch size, a full batch that is answered allows a larger batch on next update
+            self._batch_size.probe()
 
         changed = False
         callbacks = []
         for prop in results:
+            self._stale_data.discard(int(prop["did"]))
+            if prop.get("code") == XiaomiAirPurifierCapabilities.NOT_FOUND:
+                self._not_found.add(int(prop["did"]))
+            else:
+                self._not_found.discard(int(prop["did"]))
             if prop["code"] == 0 and "value" in prop:
                 did = int(prop["did"])
                 value = prop["value"]
@@ -164,6 +191,58 @@ class XiaomiAirPurifierDevice:
                 self._property_changed()
         return changed
 
+    async def _request_chunks(self, props: list[dict[str, Any]], budget: XiaomiAirPurifierRetryBudget) -> list[dict[str, Any]]:
+        """Split properties by the current batch size and request the chunks concurrently.
+        Protocol limits the number of requests in flight. Properties of the failed chunks are marked as stale if at least one chunk is succeeded."""
+        size = self._batch_size.size
+        chunks = [props[i:i + size] for i in range(0, len(props), size)]
+        results = []
+        failed = None
+        responses = await asyncio.gather(
+            *[self._request_chunk(chunk, budget) for chunk in chunks],
+            return_exceptions=True,
+        )
+        for chunk, response in zip(chunks, responses):
+            if isinstance(response, BaseException):
+                failed = response
+                self._stale_data.update(int(prop["did"]) for prop in chunk)
+            else:
+                results.extend(response)
+
+        if failed is not None:
+            if not results:
+                raise failed
+            _LOGGER.debug("Properties request partially failed: %s", failed)
+        return results
+
+    async def _request_chunk(self, props: list[dict[str, Any]], budget: XiaomiAirPurifierRetryBudget) -> list[dict[str, Any]]:
+        """Request a single chunk of properties until the device responds or the retry budget is exhausted.
+        Chunks larger than the confirmed batch size are probes and split into smaller chunks when the device drops or truncates them."""
+        probing = len(props) > self._batch_size.confirmed
+        while True:
+            try:
+                result = await asyncio.wait_for(self._protocol.get_properties(props, retry_count=0), budget.remaining)
+            except (DeviceException, asyncio.TimeoutError) as ex:
+                if probing and budget.remaining and self._batch_size.failed(len(props)):
+                    _LOGGER.debug("Batch size %s failed, retrying with %s", len(props), self._batch_size.size)
+                    return await self._request_chunks(props, budget)
+                if not await budget.retry():
+                    raise DeviceException(f"Properties request failed: {ex}") from None
+                continue
+
+            if result is None:
+                if not await budget.retry():
+                    raise DeviceException("Properties request failed: No response")
+                continue
+
+            if probing and len(result) < len(props) and self._batch_size.failed(len(props)):
+                _LOGGER.debug("Batch size %s truncated to %s, retrying with %s", len(props), len(result), self._batch_size.size)
+                received = [str(prop.get("did")) for prop in result]
+                return result + await self._request_chunks([prop for prop in props if prop["did"] not in received], budget)
+
+            self._batch_size.succeeded(len(props))
+            return result
+
     def _update_property(self, prop: XiaomiAirPurifierProperty, value: Any, force = False) -> Any:
         """Update device property on memory and notify listeners."""
         if prop in self.property_mapping:
@@ -192,17 +271,20 @@ class XiaomiAirPurifierDevice:
             _LOGGER.debug("Update Callback")
             self._update_callback()
 
+    def _polled(self) -> None:
+        """Call external listener when the device answered a poll"""
+        if self._poll_callback:
+            self._poll_callback()
+
     def _update_failed(self, ex) -> None:
         """Call external listener when update failed"""
         if self._error_callback:
             self._error_callback(ex)
 
-    def _update_task(self) -> None:
-        """Timer task for updating properties periodically"""
-        self._update_timer = None
-        
+    async def _update_task(self) -> None:
+        """Scheduler task for updating properties periodically"""
         try:
-            self.update()
+            await self.update()
             self._update_fail_count = 0
             self._last_update_failed = None
         except Exception as ex:
@@ -216,21 +298,34 @@ class XiaomiAirPurifierDevice:
                     self.available = False
                     self._update_failed(ex)
               
-        self.schedule_update(self._update_interval)
+        self.schedule_update()
 
-    def connect_device(self) -> None:
+    async def connect_device(self) -> None:
         """Connect to the device api."""
         _LOGGER.info("Connecting to device")
-        self.info = XiaomiAirPurifierDeviceInfo(self._protocol.connect())
+        self.info = XiaomiAirPurifierDeviceInfo(await self._protocol.connect())
+        self._batch_size = XiaomiAirPurifierBatchSize.get(self.info.model, self.info.firmware_version, len(self.property_mapping))
         if self.mac is None:
             self.mac = self.info.mac_address
         _LOGGER.info("Connected to device: %s %s", self.info.model, self.info.firmware_version)
+
+        capabilities = None
+        if not self._ready:
+            capabilities = XiaomiAirPurifierCapabilities.get(self.info.model, self.info.firmware_version)
+            self._unsupported = set(capabilities[1]) if capabilities else set()
             
-        self._last_settings_request = time.time()
-        self._last_consumable_request = self._last_settings_request
-        self._last_telemetry_request = self._last_settings_request
         self._dirty_data = {}
-        self._request_properties()
+        now = time.time()
+        await self._request_properties()
+        if not self._ready and capabilities is None and not self._stale_data and self._protocol.local_connected:
+            # Full local scan is completed, properties that the device answered as not exist are not requested on next start.
+            # Cloud results are not used, properties that are not reported to the cloud yet are not known to be missing.
+            requested = {prop.value for prop, mapping in self.property_mapping.items() if "aiid" not in mapping}
+            XiaomiAirPurifierCapabilities.learn(
+                self.info.model, self.info.firmware_version, requested & set(self.data), requested & self._not_found
+            )
+        self._poll_planner.stagger(now)
+        self._adaptive_interval.reset()
         self._last_update_failed = None
         if not self.available:
             self.available = True
@@ -239,10 +334,20 @@ class XiaomiAirPurifierDevice:
 
         self._ready = True
 
-    def connect_cloud(self) -> None:
+    async def connect_cloud(self) -> None:
         """Connect to the cloud api."""
-        if self._protocol.cloud and not self._protocol.cloud.logged_in:
-            self._protocol.cloud.login()            
+        if self._protocol.cloud and not self._protocol.cloud.connected:
+            if self._protocol.cloud.logged_in:
+                # Restored session, a full login is only required when the cloud rejects its token
+                token, host = await self._protocol.cloud.get_info(self.mac)
+                if self._protocol.cloud.logged_in:
+                    if token:
+                        self.token, self.host = token, host
+                        self._protocol.set_credentials(self.host, self.token, self.mac)
+                    return
+                _LOGGER.info("Stored cloud session is expired, logging in again")
+
+            await self._protocol.cloud.login()
             if self._protocol.cloud.logged_in is False:
                 if self._protocol.cloud.two_factor_url:
                     self.two_factor_url = self._protocol.cloud.two_factor_url                    
@@ -253,15 +358,26 @@ class XiaomiAirPurifierDevice:
                     self.two_factor_url = None
                     self._property_changed()
 
-                self.token, self.host = self._protocol.cloud.get_info(
+                self.token, self.host = await self._protocol.cloud.get_info(
                     self.mac)
                 self._protocol.set_credentials(
                     self.host, self.token, self.mac)
 
-    def disconnect(self) -> None:
+    @property
+    def cloud_auth(self) -> dict[str, Any] | None:
+        """Session tokens of the cloud login for persisting them between restarts."""
+        return self._protocol.auth
+
+    def restore_cloud_auth(self, auth: dict[str, Any]) -> None:
+        """Reuse the session tokens of a previous cloud login."""
+        if not self.cloud_connected:
+            self._protocol.restore(auth)
+
+    async def disconnect(self) -> None:
         """Disconnect from device and cancel timers"""
         _LOGGER.info("Disconnect")
         self.schedule_update(-1)
+        await self._protocol.disconnect()
 
     def listen(self, callback, property: XiaomiAirPurifierProperty = None) -> None:
         """Set callback functions for external listeners"""
@@ -277,23 +393,36 @@ class XiaomiAirPurifierDevice:
                 self._property_update_callback[property.value] = []
             self._property_update_callback[property.value].append(callback)
 
+    def subscribe(self, prop: XiaomiAirPurifierProperty) -> None:
+        """Request the property on updates, called when an entity that shows the property is added."""
+        self._poll_planner.subscribe(prop)
+
+    def unsubscribe(self, prop: XiaomiAirPurifierProperty) -> None:
+        """Stop requesting the property when it has no subscribers left and it is not used by the device status."""
+        self._poll_planner.unsubscribe(prop)
+
     def listen_error(self, callback) -> None:
         """Set error callback function for external listeners"""
         self._error_callback = callback
 
+    def listen_poll(self, callback) -> None:
+        """Set callback function that is called after every successful poll"""
+        self._poll_callback = callback
+
     def schedule_update(self, wait: float = None) -> None:
         """Schedule a device update for future"""
+        # Periodic updates of the devices of an account are aligned, so their cloud polls are aggregated
+        group = self._protocol.poll_group if wait is None else None
         if not wait:
             wait = self._update_interval
 
-        if self._update_timer is not None:
-            self._update_timer.cancel()
-            del self._update_timer
-            self._update_timer = None
+        if self._scheduler is None:
+            return
 
         if wait >= 0:
-            self._update_timer = Timer(wait, self._update_task)
-            self._update_timer.start()
+            self._scheduler.schedule(self, wait, self._update_task, group, group.poll_tick if group else 0)
+        else:
+            self._scheduler.cancel(self)
 
     def get_property(self, prop: XiaomiAirPurifierProperty) -> Any:
         """Get a device property from memory"""
@@ -301,7 +430,7 @@ class XiaomiAirPurifierDevice:
             return self.data[prop.value]
         return None
 
-    def set_property(self, prop: XiaomiAirPurifierProperty, value: Any, force = False) -> bool:
+    async def set_property(self, prop: XiaomiAirPurifierProperty, value: Any, force = False) -> bool:
         """Sets property value using the existing property mapping and notify listeners
         Property must be set on memory first and notify its listeners because device does not return new value immediately."""
         
@@ -312,13 +441,14 @@ class XiaomiAirPurifierDevice:
                 "Set Property: %s: %s -> %s", prop, current_value, value
             )
             self._last_change = time.time()
-            self._last_settings_request = 0
+            self._poll_planner.expire(POLL_GROUP_SETTINGS)
+            self._adaptive_interval.reset()
 
             try:
                 mapping = self.property_mapping[prop]
                 retries = 0
                 while retries < 2:
-                    result = self._protocol.set_property(mapping["siid"], mapping["piid"], value)
+                    result = await self._protocol.set_property(mapping["siid"], mapping["piid"], value)
                     if result and result[0]["code"] != 0:
                         retries = retries + 1
                         continue
@@ -347,104 +477,54 @@ class XiaomiAirPurifierDevice:
         self.schedule_update(1)
         return False
 
-    def update(self) -> None:
+    async def update(self) -> None:
         """Get properties from the device."""
         _LOGGER.debug("Device update: %s", self._update_interval)
+        if self._scheduler is None:
+            self._scheduler = XiaomiAirPurifierUpdateScheduler.get(asyncio.get_running_loop())
 
         if self._update_running:
             return
 
         if not self.cloud_connected:
-            self.connect_cloud()
+            await self.connect_cloud()
 
         if not self.device_connected:
-            self.connect_device()
+            await self.connect_device()
 
         if not self.device_connected:
             raise DeviceUpdateFailedException("Device cannot be reached")
 
         self._update_running = True
 
-        # Read-only properties
-        properties = [
-            XiaomiAirPurifierProperty.FAULT,
-            XiaomiAirPurifierProperty.FAN_LEVEL,
-            XiaomiAirPurifierProperty.PM2_5,
-            XiaomiAirPurifierProperty.DOOR_STATUS,
-            XiaomiAirPurifierProperty.AIR_QUALITY,
-        ]
-
         now = time.time()
-        if self.status.power:
-            # Only changed when device is active
-            properties.extend([
-                    XiaomiAirPurifierProperty.FAN_SPEED,
-                    XiaomiAirPurifierProperty.FAN_SET_SPEED,
-               ])
-
-        if now - self._last_settings_request > 9:
-            self._last_settings_request = now
-
-            # Read/Write properties
-            properties.extend(
-                [
-                    XiaomiAirPurifierProperty.POWER,
-                    XiaomiAirPurifierProperty.MODE,
-                    XiaomiAirPurifierProperty.SCREEN_BRIGHTNESS,
-                    XiaomiAirPurifierProperty.TEMPERATURE_UNIT,
-                    XiaomiAirPurifierProperty.MANUAL_FAN_LEVEL,
-                    XiaomiAirPurifierProperty.SOUND,
-                    XiaomiAirPurifierProperty.CHILD_LOCK,
-                    XiaomiAirPurifierProperty.SPEED,
-                    XiaomiAirPurifierProperty.COVERAGE,
-                    XiaomiAirPurifierProperty.IONIZER,
-                ]
-            )
-        if now - self._last_telemetry_request > 30:
-            self._last_telemetry_request = now
-
-            # Read/Write properties
-            properties.extend(
-                [
-                    XiaomiAirPurifierProperty.HUMIDITY,
-                    XiaomiAirPurifierProperty.TEMPERATURE,
-                    XiaomiAirPurifierProperty.AVERAGE_PM2_5,
-                    XiaomiAirPurifierProperty.FILTER_USED_TIME,
-                    XiaomiAirPurifierProperty.CLEANED_AREA,
-                ]
-            )
+        # Properties that are failed on previous update take the place of the deferred ones
+        properties = self._poll_planner.due(self, now, self._batch_size.size - len(self._stale_data))
 
-        if now - self._last_consumable_request > 119 or self._consumable_reset:
-            self._last_consumable_request = now
-
-            # Read/Write properties
-            properties.extend(
-                [
-                    XiaomiAirPurifierProperty.FILTER_LIFE_LEFT,
-                    XiaomiAirPurifierProperty.FILTER_LEFT_TIME,
-                    XiaomiAirPurifierProperty.RFID_TAG,
-                    XiaomiAirPurifierProperty.RFID_MANUFACTURER,
-                    XiaomiAirPurifierProperty.RFID_PRODUCT,
-                    XiaomiAirPurifierProperty.RFID_TIME,
-                    XiaomiAirPurifierProperty.RFID_SERIAL,
-                    XiaomiAirPurifierProperty.REBOOT_REASON,
-                    #XiaomiAirPurifierProperty.COUNTRY_CODE,
-                ]
-            )
+        # Request properties that are failed on previous update again
+        for did in self._stale_data:
+            prop = XiaomiAirPurifierProperty(did)
+            if prop not in properties:
+                properties.append(prop)
+
+        if not properties:
+            # Empty list requests all properties
+            self._update_running = False
+            return
 
         try:
-            self._request_properties(properties)
+            await self._request_properties(properties)
         except Exception as ex:
             self._update_running = False
             raise DeviceUpdateFailedException(ex) from None
 
-        if self._consumable_reset:
-            self._consumable_reset = False
-
+        self._adaptive_interval.observe(self.data)
+        self._poll_planner.requested(properties, now)
         self._update_running = False
+        self._polled()
         
 
-    def call_action(self, action: XiaomiAirPurifierAction, parameters: dict[str, Any] = None) -> dict[str, Any] | None:
+    async def call_action(self, action: XiaomiAirPurifierAction, parameters: dict[str, Any] = None) -> dict[str, Any] | None:
         """Call an action."""
         if action not in self.action_mapping:
             raise InvalidActionException(
@@ -461,14 +541,15 @@ class XiaomiAirPurifierDevice:
 
         # Reset consumable on memory
         if action is XiaomiAirPurifierAction.RESET_FILTER:
-            self._consumable_reset = True
+            # Request consumable properties on next update otherwise they will only be requested after their interval
+            self._poll_planner.expire(POLL_GROUP_CONSUMABLE)
             self._update_property(XiaomiAirPurifierProperty.FILTER_LIFE_LEFT, 100)        
 
         # Update listeners
         self._property_changed()
             
         try:
-            result = self._protocol.action(
+            result = await self._protocol.action(
                 mapping["siid"], mapping["aiid"], parameters)
             if result and result.get("code") != 0:
                 result = None
@@ -480,13 +561,14 @@ class XiaomiAirPurifierDevice:
         if result:
             _LOGGER.info("Send action %s", action.name)
             self._last_change = time.time()
-            self._last_settings_request = 0
+            self._poll_planner.expire(POLL_GROUP_SETTINGS)
+            self._adaptive_interval.reset()
 
         # Schedule update for retrieving new properties after action sent
         self.schedule_update(3)
         return result
 
-    def send_command(self, command: str, parameters: dict[str, Any]) -> dict[str, Any] | None:
+    async def send_command(self, command: str, parameters: dict[str, Any]) -> dict[str, Any] | None:
         """Send a raw command to the device. This is mostly useful when trying out
         commands which are not implemented by a given device instance. (Not likely)"""
 
@@ -494,99 +576,142 @@ class XiaomiAirPurifierDevice:
             raise InvalidActionException("Invalid Command: (%s).", command)
 
         self.schedule_update(10)
-        self._protocol.send(command, parameters, 1)
+        await self._protocol.send(command, parameters, 1)
         self.schedule_update(2)
 
-    def turn_on(self) -> bool:
+    async def get_property_history(
+        self, prop: XiaomiAirPurifierProperty, time_start: int, time_end: int, limit: int = 100
+    ) -> AsyncIterator[list[tuple[int, Any]]]:
+        """Stream the values of a property reported to the cloud between given timestamps, newest page first.
+        Pages are requested backwards from time_end and samples that are returned on more than one page are dropped."""
+        cloud = self._protocol.cloud
+        if prop not in self.property_mapping:
+            return
+        if not self.cloud_connected or not cloud.device_id:
+            raise DeviceException("Cloud connection is not available")
+
+        mapping = self.property_mapping[prop]
+        key = f'{mapping["siid"]}.{mapping["piid"]}'
+        seen: set[int] = set()
+        while time_end >= time_start:
+            page = await cloud.get_device_property(key, limit, time_start, time_end)
+            if page is None:
+                raise DeviceException(f"History request of {prop.name} failed")
+
+            samples = []
+            received = len(seen)
+            for item in page:
+                timestamp = int(item["time"])
+                if timestamp in seen:
+                    continue
+                seen.add(timestamp)
+                try:
+                    value = json.loads(item["value"])
+                except (TypeError, ValueError):
+                    value = item["value"]
+                if isinstance(value, list):
+                    value = value[0] if value else None
+                if value is not None:
+                    samples.append((timestamp, value))
+
+            if samples:
+                yield samples
+
+            if len(page) < limit or len(seen) == received:
+                break
+            # Samples on the boundary are requested again on next page and skipped
+            time_end = min(int(item["time"]) for item in page)
+
+    async def turn_on(self) -> bool:
         """Turn on."""
-        return self.set_property(XiaomiAirPurifierProperty.POWER, True)
+        return await self.set_property(XiaomiAirPurifierProperty.POWER, True)
     
-    def turn_off(self) -> bool:
+    async def turn_off(self) -> bool:
         """Turn off."""        
-        if self.set_property(XiaomiAirPurifierProperty.POWER, False):            
+        if await self.set_property(XiaomiAirPurifierProperty.POWER, False):            
             self._update_property(XiaomiAirPurifierProperty.FAN_SPEED, 0)
             return True
         return False
 
-    def set_coverage(self, coverage) -> bool:
+    async def set_coverage(self, coverage) -> bool:
         if not self.status.power:
-            self.turn_on()
+            await self.turn_on()
         if int(coverage) == XiaomiAirPurifierCoverage.MANUAL.value:
-            return self.set_speed_percent(self.status.speed_percent)
-        result = self.set_property(XiaomiAirPurifierProperty.COVERAGE, int(coverage)) 
+            return await self.set_speed_percent(self.status.speed_percent)
+        result = await self.set_property(XiaomiAirPurifierProperty.COVERAGE, int(coverage))
         if result:
             if self.status.mode != XiaomiAirPurifierMode.FAVORITE:
-                self.set_mode(XiaomiAirPurifierMode.FAVORITE.value)
+                await self.set_mode(XiaomiAirPurifierMode.FAVORITE.value)
             elif coverage != XiaomiAirPurifierCoverage.MANUAL and self.status.mode == XiaomiAirPurifierMode.FAVORITE:
-                self._request_properties([XiaomiAirPurifierProperty.SPEED, XiaomiAirPurifierProperty.FAN_SET_SPEED, XiaomiAirPurifierProperty.FAN_LEVEL])
+                await self._request_properties([XiaomiAirPurifierProperty.SPEED, XiaomiAirPurifierProperty.FAN_SET_SPEED, XiaomiAirPurifierProperty.FAN_LEVEL])
         return result
 
-    def set_fan_level(self, fan_level) -> bool:
+    async def set_fan_level(self, fan_level) -> bool:
         currentMode = self.status.mode
         if not self.status.power:
             self._update_property(XiaomiAirPurifierProperty.POWER, True)      
         self._update_property(XiaomiAirPurifierProperty.MODE, XiaomiAirPurifierMode.MANUAL.value)
         if currentMode == XiaomiAirPurifierMode.AUTO or currentMode == XiaomiAirPurifierMode.SLEEP:
             self._update_property(XiaomiAirPurifierProperty.MANUAL_FAN_LEVEL, int(fan_level))
-            return self.set_property(XiaomiAirPurifierProperty.FAN_LEVEL, int(fan_level), True)
+            return await self.set_property(XiaomiAirPurifierProperty.FAN_LEVEL, int(fan_level), True)
         else:
             self._update_property(XiaomiAirPurifierProperty.FAN_LEVEL, int(fan_level))
-            return self.set_property(XiaomiAirPurifierProperty.MANUAL_FAN_LEVEL, int(fan_level), True)
+            return await self.set_property(XiaomiAirPurifierProperty.MANUAL_FAN_LEVEL, int(fan_level), True)
 
-    def set_speed_percent(self, percent) -> bool:
+    async def set_speed_percent(self, percent) -> bool:
         min = 200
         max = 2000
         speed = ((max - min) * (percent / 100.0)) + min
         if self.status.mode == XiaomiAirPurifierMode.FAVORITE:
             self._update_property(XiaomiAirPurifierProperty.FAN_SET_SPEED, int(speed))
         self._update_property(XiaomiAirPurifierProperty.COVERAGE, XiaomiAirPurifierCoverage.MANUAL.value)
-        if self.set_property(XiaomiAirPurifierProperty.SPEED, int(speed), True):
+        if await self.set_property(XiaomiAirPurifierProperty.SPEED, int(speed), True):
             if self.status.mode != XiaomiAirPurifierMode.FAVORITE:
-                return self.set_mode(XiaomiAirPurifierMode.FAVORITE.value)
+                return await self.set_mode(XiaomiAirPurifierMode.FAVORITE.value)
             return True
         return False
 
-    def set_mode(self, mode: int) -> bool:
+    async def set_mode(self, mode: int) -> bool:
         """Set mode."""   
         if mode == XiaomiAirPurifierMode.SLEEP.value:
             self._update_property(XiaomiAirPurifierProperty.FAN_LEVEL, XiaomiAirPurifierFanLevel.LOW.value)
         elif mode == XiaomiAirPurifierMode.MANUAL.value:
             self._update_property(XiaomiAirPurifierProperty.FAN_LEVEL, self.status.manual_fan_level.value)          
-        if self.set_property(XiaomiAirPurifierProperty.MODE, mode, True):
+        if await self.set_property(XiaomiAirPurifierProperty.MODE, mode, True):
             if not self.status.power:
                 self._update_property(XiaomiAirPurifierProperty.POWER, True)      
             if mode == XiaomiAirPurifierMode.AUTO.value or (self.status.coverage != XiaomiAirPurifierCoverage.MANUAL and mode == XiaomiAirPurifierMode.FAVORITE):
-                self._request_properties([XiaomiAirPurifierProperty.SPEED, XiaomiAirPurifierProperty.FAN_LEVEL, XiaomiAirPurifierProperty.FAN_SET_SPEED])
+                await self._request_properties([XiaomiAirPurifierProperty.SPEED, XiaomiAirPurifierProperty.FAN_LEVEL, XiaomiAirPurifierProperty.FAN_SET_SPEED])
             return True
         return False
 
-    def set_percentage(self, percent) -> bool:
+    async def set_percentage(self, percent) -> bool:
         """Set percentage of fan level."""
         if percent == 100 and self.status.mode == XiaomiAirPurifierMode.SLEEP:
             if not self.status.power:
-                self.turn_on()
+                await self.turn_on()
             return
 
         if self.status.mode == XiaomiAirPurifierMode.FAVORITE:
             if not self.status.power:
-                self.turn_on()
+                await self.turn_on()
             coverage = self.status.coverage
             if coverage != -1 and coverage != XiaomiAirPurifierCoverage.MANUAL:
-                return self.set_coverage(math.ceil(self.percentage_to_ranged_value((1, 12), percent) - 1))
-            return self.set_speed_percent(percent)
-        return self.set_fan_level(math.ceil(self.percentage_to_ranged_value((1, 3), percent)))
+                return await self.set_coverage(math.ceil(self.percentage_to_ranged_value((1, 12), percent) - 1))
+            return await self.set_speed_percent(percent)
+        return await self.set_fan_level(math.ceil(self.percentage_to_ranged_value((1, 3), percent)))
 
-    def reset_filter(self):
-        return self.call_action(XiaomiAirPurifierAction.RESET_FILTER)
+    async def reset_filter(self):
+        return await self.call_action(XiaomiAirPurifierAction.RESET_FILTER)
 
-    def toggle_power(self):
-        return self.call_action(XiaomiAirPurifierAction.TOGGLE_POWER)
+    async def toggle_power(self):
+        return await self.call_action(XiaomiAirPurifierAction.TOGGLE_POWER)
     
-    def toggle_mode(self):
-        return self.call_action(XiaomiAirPurifierAction.TOGGLE_MODE)
+    async def toggle_mode(self):
+        return await self.call_action(XiaomiAirPurifierAction.TOGGLE_MODE)
     
-    def toggle_fan_level(self):
-        return self.call_action(XiaomiAirPurifierAction.TOGGLE_FAN_LEVEL)
+    async def toggle_fan_level(self):
+        return await self.call_action(XiaomiAirPurifierAction.TOGGLE_FAN_LEVEL)
 
     @property
     def _update_interval(self) -> float:
@@ -594,7 +719,7 @@ class XiaomiAirPurifierDevice:
         now = time.time()
         if self._last_update_failed:
             return 5 if now - self._last_update_failed <= 60 else 10 if now - self._last_update_failed <= 300 else 30
-        return 3 if self.status.power else 10
+        return self._adaptive_interval.interval(self.status.power)
 
     @property
     def name(self) -> str:
@@ -625,6 +750,20 @@ class XiaomiAirPurifierDeviceStatus:
     screen_brightness_list = {v: k for k, v in SCREEN_BRIGHTNESS_TO_NAME.items()}
     temperature_unit_list = {v: k for k, v in TEMPERATURE_UNIT_TO_NAME.items()}
     coverage_list = {v: k for k, v in COVERAGE_TO_NAME.items()}
+    # Properties that are exposed as attributes of the device
+    attribute_properties = [
+        XiaomiAirPurifierProperty.FAULT,
+        XiaomiAirPurifierProperty.FAN_LEVEL,
+        XiaomiAirPurifierProperty.SPEED,
+        XiaomiAirPurifierProperty.COVERAGE,
+        XiaomiAirPurifierProperty.REBOOT_REASON,
+        XiaomiAirPurifierProperty.FILTER_LIFE_LEFT,
+        XiaomiAirPurifierProperty.DOOR_STATUS,
+        XiaomiAirPurifierProperty.MANUAL_FAN_LEVEL,
+        XiaomiAirPurifierProperty.COUNTRY_CODE,
+        XiaomiAirPurifierProperty.PM2_5,
+        XiaomiAirPurifierProperty.AVERAGE_PM2_5,
+    ]
 
     def __init__(self, device):
         self._device = device
@@ -886,23 +1025,9 @@ class XiaomiAirPurifierDeviceStatus:
     @property
     def attributes(self) -> dict[str, Any] | None:
         """Return the attributes of the device."""
-        properties = [
-            XiaomiAirPurifierProperty.FAULT,
-            XiaomiAirPurifierProperty.FAN_LEVEL,
-            XiaomiAirPurifierProperty.SPEED,
-            XiaomiAirPurifierProperty.COVERAGE,
-            XiaomiAirPurifierProperty.REBOOT_REASON,
-            XiaomiAirPurifierProperty.FILTER_LIFE_LEFT,
-            XiaomiAirPurifierProperty.DOOR_STATUS,
-            XiaomiAirPurifierProperty.MANUAL_FAN_LEVEL,
-            XiaomiAirPurifierProperty.COUNTRY_CODE,
-            XiaomiAirPurifierProperty.PM2_5,
-            XiaomiAirPurifierProperty.AVERAGE_PM2_5,
-        ]
-
         attributes = {}
      
-        for prop in properties:
+        for prop in self.attribute_properties:
             value = self._get_property(prop)
             if value is not None:
                 prop_name = PROPERTY_TO_NAME.get(prop)
@@ -931,6 +1056,334 @@ class XiaomiAirPurifierDeviceStatus:
         return attributes
 
 
+@dataclass
+class XiaomiAirPurifierRetryPolicy:
+    """Retry limits of a single properties request."""
+
+    retries: int = 3  # Retries allowed for all chunks of the request
+    timeout: float = 10  # Upper bound of the request duration in seconds
+    backoff: float = 0.25  # Base delay before a retry, doubled on every retry
+    max_backoff: float = 2  # Upper bound of the delay before a retry
+
+    def start(self) -> XiaomiAirPurifierRetryBudget:
+        """Start tracking the budget of a new request."""
+        return XiaomiAirPurifierRetryBudget(self)
+
+
+class XiaomiAirPurifierRetryBudget:
+    """Remaining time and retries of a properties request."""
+
+    def __init__(self, policy: XiaomiAirPurifierRetryPolicy) -> None:
+        self._policy = policy
+        self._deadline = time.monotonic() + policy.timeout
+        self._retries = 0
+
+    @property
+    def remaining(self) -> float:
+        """Remaining time of the request in seconds."""
+        return max(0, self._deadline - time.monotonic())
+
+    async def retry(self) -> bool:
+        """Wait for a jittered backoff delay. Returns false if another attempt does not fit in the budget."""
+        if self._retries >= self._policy.retries:
+            return False
+
+        delay = random.uniform(0, min(self._policy.max_backoff, self._policy.backoff * 2 ** self._retries))
+        if delay >= self.remaining:
+            return False
+
+        self._retries = self._retries + 1
+        await asyncio.sleep(delay)
+        return True
+
+
+class XiaomiAirPurifierBatchSize:
+    """Largest number of properties the device answers reliably in a single get_properties request."""
+
+    DEFAULT: int = 15
+    MINIMUM: int = 4
+    STEP: int = 5
+    FAILURES: int = 2  # Failed requests with the same batch size before the size is not probed again
+    RECOVERY: int = 500  # Successful requests after which the larger batch sizes are probed again
+
+    # Learned batch sizes by model and firmware version
+    _learned: dict[tuple[str, str], XiaomiAirPurifierBatchSize] = {}
+    changed: bool = False  # Learned limits are changed since they are last dumped
+
+    def __init__(self, maximum: int) -> None:
+        self.maximum: int = maximum  # Number of the mapped properties
+        self.size: int = min(self.DEFAULT, maximum)  # Current batch size
+        self.confirmed: int = 0  # Largest batch size answered by the device
+        self.limit: int = maximum  # Largest batch size that is not failed repeatedly
+        self._failures: dict[int, int] = {}  # Number of failed requests by batch size
+        self._successes: int = 0  # Successful requests since the last failure
+
+    @classmethod
+    def get(cls, model: str, firmware_version: str, maximum: int) -> XiaomiAirPurifierBatchSize:
+        """Return the shared batch size of the model and firmware version."""
+        key = (model, firmware_version)
+        if key not in cls._learned:
+            cls._learned[key] = cls(maximum)
+        return cls._learned[key]
+
+    @classmethod
+    def restore(cls, data: list[dict[str, Any]]) -> None:
+        """Restore batch sizes that are learned on previous runs."""
+        for item in data or []:
+            try:
+                key = (item["model"], item["firmware_version"])
+                if key not in cls._learned:
+                    batch_size = cls(int(item["maximum"]))
+                    batch_size.confirmed = int(item["confirmed"])
+                    batch_size.limit = max(batch_size.confirmed, min(batch_size.maximum, int(item["limit"])))
+                    batch_size.size = max(cls.MINIMUM, min(batch_size.limit, int(item["size"])))
+                    cls._learned[key] = batch_size
+            except (KeyError, TypeError, ValueError):
+                _LOGGER.debug("Invalid stored batch size: %s", item)
+
+    @classmethod
+    def dump(cls) -> list[dict[str, Any]]:
+        cls.changed = False
+        return [
+            {
+                "model": model,
+                "firmware_version": firmware_version,
+                "maximum": batch_size.maximum,
+                "size": batch_size.size,
+                "confirmed": batch_size.confirmed,
+                "limit": batch_size._probe_limit,
+            }
+            for (model, firmware_version), batch_size in cls._learned.items()
+            if batch_size.confirmed
+        ]
+
+    @property
+    def _probe_limit(self) -> int:
+        """Largest batch size to probe, sizes that are failed once are not probed again until the recovery."""
+        if self._failures:
+            return max(self.confirmed, min(self.limit, min(self._failures) - 1))
+        return self.limit
+
+    def succeeded(self, size: int) -> None:
+        """Device answered a request with given batch size."""
+        if size > self.confirmed:
+            self.confirmed = size
+            XiaomiAirPurifierBatchSize.changed = True
+        self._failures = {failed: count for failed, count in self._failures.items() if failed > size}
+
+        self._successes = self._successes + 1
+        if self._successes >= self.RECOVERY:
+            # Larger sizes may be failed because of lost packets, they are probed again
+            self._successes = 0
+            self._failures = {}
+            if self.limit < self.maximum:
+                self.limit = min(self.maximum, self.limit + self.STEP)
+                XiaomiAirPurifierBatchSize.changed = True
+
+    def failed(self, size: int) -> bool:
+        """Device dropped or truncated a request with given batch size. Returns false if the request cannot be split."""
+        if size <= self.confirmed or size <= self.MINIMUM:
+            return False
+
+        self._successes = 0
+        if size > self.size:
+            # Another chunk of the same request is already failed and the size is lowered
+            return True
+
+        self._failures[size] = self._failures.get(size, 0) + 1
+        if self._failures[size] >= self.FAILURES and self.limit >= size:
+            # Size is only excluded when it is failed repeatedly, a single lost packet does not limit the size
+            self.limit = size - 1
+        XiaomiAirPurifierBatchSize.changed = True
+        self.size = max(self.MINIMUM, min(self.size, self.confirmed if self.confirmed else size // 2))
+        return True
+
+    def probe(self) -> None:
+        """Increase the batch size until it reaches the largest size that is not failed."""
+        limit = self._probe_limit
+        if self.size < limit:
+            self.size = min(limit, self.size + self.STEP)
+
+
+class XiaomiAirPurifierAdaptiveInterval:
+    """Update interval that is lengthened while the readings are steady and tightened when they change."""
+
+    # Smallest absolute and relative change of a watched property that is considered as a movement
+    thresholds: dict[XiaomiAirPurifierProperty, tuple[float, float]] = {
+        XiaomiAirPurifierProperty.PM2_5: (3, 0.15),
+        XiaomiAirPurifierProperty.FAN_SPEED: (100, 0.1),
+        XiaomiAirPurifierProperty.AIR_QUALITY: (1, 0),
+    }
+    growth: float = 1.5  # Interval is multiplied by this factor after every steady update
+    smoothing: float = 0.3  # Weight of the latest reading in the baseline of a watched property
+    off_interval: float = 10  # Shortest interval while the device is off
+
+    def __init__(self, minimum: float = 3, maximum: float = 15) -> None:
+        self.minimum = minimum  # Floor of the interval in seconds
+        self.maximum = max(minimum, maximum)  # Ceiling of the interval in seconds
+        self.value = self.minimum  # Current interval without the power state
+        # Smoothed values of the watched properties, readings are compared with them so sensor noise is not a movement
+        self._baseline: dict[XiaomiAirPurifierProperty, float] = {}
+
+    def observe(self, data: dict[int, Any]) -> None:
+        """Adjust the interval from the values of the watched properties after an update."""
+        moved = False
+        for prop, (absolute, relative) in self.thresholds.items():
+            value = data.get(prop.value)
+            if not isinstance(value, (int, float)):
+                self._baseline.pop(prop, None)
+                continue
+
+            baseline = self._baseline.get(prop)
+            if baseline is None:
+                self._baseline[prop] = value
+            elif abs(value - baseline) >= max(absolute, abs(baseline) * relative):
+                moved = True
+                self._baseline[prop] = value
+            else:
+                self._baseline[prop] = baseline + self.smoothing * (value - baseline)
+
+        self.value = self.minimum if moved else min(self.maximum, self.value * self.growth)
+
+    def reset(self) -> None:
+        """Poll with the shortest interval, used after user commands."""
+        self.value = self.minimum
+
+    def interval(self, power: bool) -> float:
+        return self.value if power else min(self.maximum, max(self.value, self.off_interval))
+
+
+class XiaomiAirPurifierCapabilities:
+    """Supported and unsupported properties by model and firmware version, learned from the first full scan of a device."""
+
+    NOT_FOUND: int = -4003  # Result code of the properties that are not exist on the device
+    VERIFY_STARTS: int = 10  # Learned capabilities are scanned again on every this many starts
+
+    # Learned capabilities by model and firmware version
+    _learned: dict[tuple[str, str], tuple[frozenset[int], frozenset[int]]] = {}
+    # Number of starts the capabilities are used since they are learned
+    _starts: dict[tuple[str, str], int] = {}
+    changed: bool = False  # Capabilities are changed since they are last dumped
+
+    @classmethod
+    def get(cls, model: str, firmware_version: str) -> tuple[frozenset[int], frozenset[int]] | None:
+        """Return the supported and unsupported properties, None if the model and firmware version needs a full scan."""
+        key = (model, firmware_version)
+        if cls._starts.get(key, 0) >= cls.VERIFY_STARTS:
+            return None
+        return cls._learned.get(key)
+
+    @classmethod
+    def learn(cls, model: str, firmware_version: str, supported: set[int], unsupported: set[int]) -> None:
+        key = (model, firmware_version)
+        capabilities = (frozenset(supported), frozenset(unsupported))
+        if cls._learned.get(key) != capabilities or cls._starts.get(key):
+            cls._learned[key] = capabilities
+            cls._starts[key] = 0
+            cls.changed = True
+
+    @classmethod
+    def restore(cls, data: list[dict[str, Any]]) -> None:
+        """Restore capabilities that are stored on previous runs and count this start."""
+        for item in data or []:
+            try:
+                key = (item["model"], item["firmware_version"])
+                if key not in cls._learned:
+                    cls._learned[key] = (frozenset(item["supported"]), frozenset(item["unsupported"]))
+                    cls._starts[key] = int(item.get("starts", 0)) + 1
+                    cls.changed = True
+            except (KeyError, TypeError, ValueError):
+                _LOGGER.debug("Invalid stored capabilities: %s", item)
+
+    @classmethod
+    def dump(cls) -> list[dict[str, Any]]:
+        cls.changed = False
+        return [
+            {
+                "model": model,
+                "firmware_version": firmware_version,
+                "supported": sorted(supported),
+                "unsupported": sorted(unsupported),
+                "starts": cls._starts.get((model, firmware_version), 0),
+            }
+            for (model, firmware_version), (supported, unsupported) in cls._learned.items()
+        ]
+
+
+class XiaomiAirPurifierPollPlanner:
+    """Properties to be requested on a device update from the poll schedule."""
+
+    def __init__(
+        self,
+        schedule: dict[XiaomiAirPurifierProperty, XiaomiAirPurifierPollRule],
+        intervals: dict[str, float] = None,
+    ) -> None:
+        if intervals:
+            schedule = {
+                prop: replace(rule, interval=float(intervals[prop.name.lower()])) if prop.name.lower() in intervals else rule
+                for prop, rule in schedule.items()
+            }
+        self.schedule = schedule
+        self._last_request: dict[XiaomiAirPurifierProperty, float] = {}  # Last successful request time of the properties
+        self._subscriptions: dict[XiaomiAirPurifierProperty, int] = {}  # Number of subscribers of the properties
+
+    def due(self, device: XiaomiAirPurifierDevice, now: float, limit: int = None) -> list[XiaomiAirPurifierProperty]:
+        """Properties that their interval is elapsed and condition is met, highest priority first.
+
+        When entities are subscribed, only their properties and the properties required by the device status are due.
+
+        Properties that are requested on every update are always included, others are deferred to next updates
+        when they do not fit in the limit so a single update does not need more than one request."""
+        required = []
+        deferrable = []
+        for prop, rule in self.schedule.items():
+            if rule.condition is not None and not rule.condition(device):
+                continue
+            if self._subscriptions and not rule.required and prop not in self._subscriptions:
+                continue
+            if not rule.interval:
+                required.append(prop)
+                continue
+            overdue = (now - self._last_request.get(prop, 0)) / rule.interval
+            if overdue > 1:
+                deferrable.append((prop, overdue))
+
+        required.sort(key=lambda prop: self.schedule[prop].priority, reverse=True)
+        # Properties that are deferred longer than their interval are not deferred behind the higher priority ones anymore
+        deferrable.sort(key=lambda item: (item[1] >= 2, self.schedule[item[0]].priority, item[1]), reverse=True)
+        if limit is not None:
+            deferrable = deferrable[:max(0, limit - len(required))]
+        return required + [prop for prop, _ in deferrable]
+
+    def requested(self, properties: list[XiaomiAirPurifierProperty], now: float) -> None:
+        for prop in properties:
+            self._last_request[prop] = now
+
+    def stagger(self, now: float) -> None:
+        """Mark all properties as requested with a different phase for each group, so groups do not become due on the same update."""
+        groups = sorted({rule.group for rule in self.schedule.values() if rule.interval}, key=lambda group: min(
+            rule.interval for rule in self.schedule.values() if rule.group == group and rule.interval
+        ))
+        for prop, rule in self.schedule.items():
+            if rule.interval:
+                self._last_request[prop] = now - rule.interval * groups.index(rule.group) / len(groups)
+
+    def subscribe(self, prop: XiaomiAirPurifierProperty) -> None:
+        self._subscriptions[prop] = self._subscriptions.get(prop, 0) + 1
+
+    def unsubscribe(self, prop: XiaomiAirPurifierProperty) -> None:
+        if prop in self._subscriptions:
+            self._subscriptions[prop] = self._subscriptions[prop] - 1
+            if self._subscriptions[prop] <= 0:
+                del self._subscriptions[prop]
+
+    def expire(self, group: str) -> None:
+        """Request the properties of the group on next update."""
+        for prop, rule in self.schedule.items():
+            if rule.group == group:
+                self._last_request.pop(prop, None)
+
+
 class XiaomiAirPurifierDeviceInfo:
     """Container of device information."""
 
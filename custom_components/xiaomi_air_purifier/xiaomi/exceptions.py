@@ -2,6 +2,10 @@ class DeviceException(Exception):
     """Exception wrapping any communication errors with the device."""
 
 
+class DeviceNoResponseException(DeviceException):
+    """Request is not answered by the device, the path to the device is not working."""
+
+
 class DeviceUpdateFailedException(DeviceException):
     """ """
 
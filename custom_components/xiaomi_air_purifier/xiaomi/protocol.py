@@ -1,3 +1,6 @@
+from __future__ import annotations
+
+import asyncio
 import logging
 import random
 import hashlib
@@ -6,20 +9,92 @@ import base64
 import hmac
 import time, locale, datetime
 import tzlocal
-import requests
-from typing import Any, Dict, Optional, Tuple
-from .exceptions import DeviceException
+import aiohttp
+import struct
+from urllib.parse import urlparse
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Final, Optional, Tuple
+from .exceptions import DeviceException, DeviceNoResponseException
 from typing import Any, Optional, Tuple
-from miio.miioprotocol import MiIOProtocol
-from Crypto.Cipher import ARC4
+from Crypto.Cipher import AES, ARC4
+from Crypto.Util.Padding import pad, unpad
 
 _LOGGER = logging.getLogger(__name__)
 
-class XiaomiAirPurifierDeviceProtocol(MiIOProtocol):
-    def __init__(self, ip: str, token: str) -> None:
-        super().__init__(ip, token, 0, 0, True, 2)
+class XiaomiAirPurifierMessageCodec:
+    """Encoder and decoder of miIO packets.
+    Packet is a 32 byte header (magic, length, unknown, device id, timestamp and md5 checksum) followed by the AES encrypted JSON payload."""
+
+    HEADER: Final = struct.Struct(">HHIII")
+    HELLO: Final = bytes.fromhex("21310020" + "ff" * 28)
+
+    def __init__(self, token: bytes) -> None:
+        self.token = token
+        # AES key and iv are derived from the token only once
+        self._key = hashlib.md5(token).digest()
+        self._iv = hashlib.md5(self._key + token).digest()
+        self._header = bytearray(32)
+
+    def _cipher(self) -> Any:
+        # CBC cipher state is chained so a new cipher is required for every packet
+        return AES.new(self._key, AES.MODE_CBC, self._iv)
+
+    def encode(self, payload: Any, device_id: int, stamp: int) -> bytes:
+        """Encode a request with given device id and timestamp."""
+        data = self._cipher().encrypt(pad(json.dumps(payload).encode("utf-8") + b"\x00", 16))
+        header = self._header
+        self.HEADER.pack_into(header, 0, 0x2131, 32 + len(data), 0, device_id, stamp)
+        checksum = hashlib.md5(header[:16])
+        checksum.update(self.token)
+        checksum.update(data)
+        header[16:32] = checksum.digest()
+        return bytes(header) + data
+
+    def decode(self, packet: bytes) -> Any:
+        """Validate the checksum of a reply and return its decrypted payload."""
+        data = memoryview(packet)[32:]
+        checksum = hashlib.md5(packet[:16])
+        checksum.update(self.token)
+        checksum.update(data)
+        if checksum.digest() != packet[16:32]:
+            raise ValueError("Invalid checksum")
+
+        decrypted = unpad(self._cipher().decrypt(data), 16).rstrip(b"\x00")
+        return json.loads(decrypted.decode("utf-8"))
+
+    @classmethod
+    def decode_header(cls, packet: bytes) -> Tuple[int, int]:
+        """Return device id and timestamp of a packet."""
+        _, _, _, device_id, stamp = cls.HEADER.unpack_from(packet)
+        return device_id, stamp
+
+class XiaomiAirPurifierDeviceProtocol(asyncio.DatagramProtocol):
+    """Asyncio miIO transport for the local api of the device.
+    Socket and handshake are kept for the lifetime of the session and handshake is refreshed in background when the session is idle."""
+
+    # Idle time in seconds before the handshake is refreshed
+    keepalive_interval: float = 60
+    # Consecutive unanswered requests before the handshake is done again, a single lost packet keeps the session
+    max_timeouts: int = 2
+
+    def __init__(self, ip: str, token: str, timeout: float = 2) -> None:
         self.ip = None
         self.token = None
+        self.port = 54321
+        self._timeout = timeout
+        self._transport: asyncio.DatagramTransport = None
+        self._device_id: int = None
+        self._device_ts: int = None  # Device timestamp received with the handshake
+        self._handshake_time: float = None  # Local time of the handshake, used as the timestamp offset
+        self._last_activity: float = 0  # Last time device answered a request
+        self._keepalive: asyncio.TimerHandle = None
+        self._keepalive_task: asyncio.Task = None
+        self._message_id: int = random.randint(0, 999)
+        self._pending: dict[int, asyncio.Future] = {}
+        self._handshake: asyncio.Future = None
+        self._discovered = False
+        self._timeouts: int = 0  # Consecutive unanswered requests
+        self._codec: XiaomiAirPurifierMessageCodec = None
         self.set_credentials(ip, token)
 
     def set_credentials(self, ip: str, token: str):
@@ -31,19 +106,302 @@ class XiaomiAirPurifierDeviceProtocol(MiIOProtocol):
             if token is None or token == "":
                 token = 32 * "0"
             self.token = bytes.fromhex(token)            
+            self._codec = XiaomiAirPurifierMessageCodec(self.token)
+            self._discovered = False
+            self.close()
+
+    def connection_made(self, transport: asyncio.DatagramTransport) -> None:
+        self._transport = transport
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        self._transport = None
+        self._discovered = False
+        self._cancel_pending()
+
+    def error_received(self, exc: Exception) -> None:
+        _LOGGER.debug("Device socket error on %s: %s", self.ip, exc)
+
+    def datagram_received(self, data: bytes, addr: Any) -> None:
+        # Handshake replies are header only
+        if len(data) == 32:
+            if self._handshake is not None and not self._handshake.done():
+                self._handshake.set_result(data)
+            return
+
+        try:
+            payload = self._codec.decode(data)
+        except Exception as ex:
+            # Device session is not valid anymore, handshake on next request
+            _LOGGER.debug("Unable to parse message from %s: %s", addr, ex)
+            self._discovered = False
+            return
+
+        if not isinstance(payload, dict):
+            return
+
+        message_id = payload.get("id")
+        future = self._pending.pop(message_id, None)
+        if future is not None:
+            if not future.done():
+                self._last_activity = time.monotonic()
+                self._timeouts = 0
+                future.set_result(payload)
+        elif isinstance(message_id, int) and message_id > self._message_id:
+            # Reply to a request that is not sent in this session
+            _LOGGER.debug("Out of sequence message from %s: %s", addr, message_id)
             self._discovered = False
 
+    async def _connect(self) -> None:
+        """Open the datagram endpoint on the running event loop."""
+        if self._transport is None:
+            loop = asyncio.get_running_loop()
+            await loop.create_datagram_endpoint(lambda: self, remote_addr=(self.ip, self.port))
+
+    async def _send_handshake(self) -> None:
+        """Send hello packet and store the device id and timestamp from the reply.
+        Concurrent requests share the handshake that is already in progress."""
+        handshake = self._handshake
+        if handshake is None:
+            handshake = self._handshake = asyncio.get_running_loop().create_future()
+            self._transport.sendto(XiaomiAirPurifierMessageCodec.HELLO)
+        try:
+            data = await asyncio.wait_for(asyncio.shield(handshake), self._timeout)
+        finally:
+            if self._handshake is handshake:
+                self._handshake = None
+
+        self._device_id, self._device_ts = XiaomiAirPurifierMessageCodec.decode_header(data)
+        self._handshake_time = time.monotonic()
+        self._last_activity = self._handshake_time
+        self._timeouts = 0
+        self._discovered = True
+        if self._keepalive is None:
+            self._schedule_keepalive(self.keepalive_interval)
+
+    def _schedule_keepalive(self, delay: float) -> None:
+        self._keepalive = asyncio.get_running_loop().call_later(delay, self._check_keepalive)
+
+    def _check_keepalive(self) -> None:
+        """Refresh the handshake in background if the session is idle for keepalive interval."""
+        self._keepalive = None
+        if not self._discovered or self._transport is None:
+            return
+
+        idle = time.monotonic() - self._last_activity
+        if idle < self.keepalive_interval:
+            self._schedule_keepalive(self.keepalive_interval - idle)
+        elif self._keepalive_task is None:
+            self._keepalive_task = asyncio.get_running_loop().create_task(self._refresh_handshake())
+
+    async def _refresh_handshake(self) -> None:
+        try:
+            await self._send_handshake()
+        except (asyncio.TimeoutError, OSError) as ex:
+            _LOGGER.debug("Handshake refresh failed on %s: %s", self.ip, ex)
+            self._timed_out()
+            if self._discovered and self._keepalive is None:
+                # Refresh is tried again before the session is dropped
+                self._schedule_keepalive(self._timeout)
+        finally:
+            self._keepalive_task = None
+
+    def _timed_out(self) -> None:
+        """Count an unanswered request and drop the session when the device stopped answering."""
+        self._timeouts = self._timeouts + 1
+        if self._timeouts >= self.max_timeouts:
+            self._discovered = False
+
+    async def _send(self, method: str, parameters: Any = None) -> Any:
+        await self._connect()
+        if not self._discovered:
+            await self._send_handshake()
+
+        self._message_id = self._message_id + 1
+        request = {"id": self._message_id, "method": method, "params": parameters if parameters is not None else []}
+        stamp = self._device_ts + int(time.monotonic() - self._handshake_time + 1)
+        data = self._codec.encode(request, self._device_id, stamp)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[self._message_id] = future
+        try:
+            self._transport.sendto(data)
+            payload = await asyncio.wait_for(future, self._timeout)
+        finally:
+            self._pending.pop(request["id"], None)
+
+        if "result" in payload:
+            return payload["result"]
+        raise DeviceException(f"Device returned error for {method}: {payload.get('error')}")
+
+    async def send(self, method: str, parameters: Any = None, retry_count: int = 3) -> Any:
+        """Send a command to the device and wait for its reply."""
+        for retry in range(retry_count + 1):
+            try:
+                return await self._send(method, parameters)
+            except (asyncio.TimeoutError, OSError) as ex:
+                _LOGGER.debug("Request %s to %s failed (%s/%s): %s", method, self.ip, retry + 1, retry_count + 1, ex)
+                # Handshake is done again after consecutive timeouts, message ids that may still be answered late are skipped
+                self._timed_out()
+                self._message_id = self._message_id + 100
+        raise DeviceNoResponseException(f"No response from the device {self.ip}")
+
+    def close(self) -> None:
+        """Close the datagram endpoint."""
+        if self._keepalive is not None:
+            self._keepalive.cancel()
+            self._keepalive = None
+        if self._keepalive_task is not None:
+            self._keepalive_task.cancel()
+            self._keepalive_task = None
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+        self._discovered = False
+        self._cancel_pending()
+
+    def _cancel_pending(self) -> None:
+        for future in self._pending.values():
+            if not future.done():
+                future.cancel()
+        self._pending = {}
+
     @property
     def connected(self) -> bool:
         return self._discovered
 
-class XiaomiAirPurifierCloudProtocol:
-    def __init__(self, username: str, password: str, country: str) -> None:
+class XiaomiAirPurifierRateLimiter:
+    """Token bucket that paces requests, waiting high priority requests are served before the others."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate  # Tokens added per second
+        self.burst = burst  # Maximum number of tokens
+        self._tokens: float = burst
+        self._updated: float = None
+        self._waiters: tuple[deque[asyncio.Future], deque[asyncio.Future]] = (deque(), deque())  # High and low priority
+        self._timer: asyncio.TimerHandle = None
+
+    def _refill(self, now: float) -> None:
+        if self._updated is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, priority: bool = False) -> None:
+        """Wait for a token."""
+        loop = asyncio.get_running_loop()
+        self._refill(loop.time())
+        high, low = self._waiters
+        if self._tokens >= 1 and not high and (priority or not low):
+            self._tokens = self._tokens - 1
+            return
+
+        future = loop.create_future()
+        (high if priority else low).append(future)
+        self._arm(loop)
+        await future
+
+    def _arm(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._timer is None:
+            self._timer = loop.call_later(max(0, (1 - self._tokens) / self.rate), self._wake, loop)
+
+    def _wake(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._timer = None
+        self._refill(loop.time())
+        for waiters in self._waiters:
+            while waiters and self._tokens >= 1:
+                future = waiters.popleft()
+                # Requests that are cancelled while waiting do not consume a token
+                if not future.done():
+                    future.set_result(None)
+                    self._tokens = self._tokens - 1
+        if any(self._waiters):
+            self._arm(loop)
+
+
+class XiaomiAirPurifierCircuitBreaker:
+    """Stops sending requests after consecutive failures and lets a single probe request through after a cool down."""
+
+    CLOSED: Final = "closed"
+    OPEN: Final = "open"
+    HALF_OPEN: Final = "half_open"
+
+    def __init__(self, threshold: int = 5, cool_down: float = 30, max_cool_down: float = 300) -> None:
+        self.threshold = threshold  # Consecutive failures that open the circuit
+        self.cool_down = cool_down  # Seconds the circuit stays open before the probe
+        self.max_cool_down = max_cool_down  # Cool down is doubled up to this after every failed probe
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened: float = 0
+        self._current_cool_down = cool_down
+        self._probing = False
+
+    def allow(self) -> bool:
+        """Return whether a request may be sent now."""
+        if self.state == self.OPEN and time.monotonic() - self._opened >= self._current_cool_down:
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+        return self.state == self.CLOSED
+
+    def release(self) -> None:
+        """Give up the probe of a cancelled request so another one can be sent."""
+        self._probing = False
+
+    def success(self) -> None:
+        self.state = self.CLOSED
+        self._failures = 0
+        self._probing = False
+        self._current_cool_down = self.cool_down
+
+    def failure(self) -> None:
+        self._failures = self._failures + 1
+        if self.state == self.HALF_OPEN:
+            self._current_cool_down = min(self._current_cool_down * 2, self.max_cool_down)
+            self._open()
+        elif self.state == self.CLOSED and self._failures >= self.threshold:
+            self._open()
+
+    def _open(self) -> None:
+        if self.state != self.OPEN:
+            _LOGGER.warning("Cloud requests are suspended for %s seconds after %s failures", self._current_cool_down, self._failures)
+        self.state = self.OPEN
+        self._opened = time.monotonic()
+        self._probing = False
+
+
+class XiaomiAirPurifierCloudSession:
+    """Login and tokens of a Xiaomi account, shared by all devices of the account."""
+
+    _instances: dict[tuple, XiaomiAirPurifierCloudSession] = {}
+
+    # Service token is renewed with the pass token in background when it is older than this in seconds
+    refresh_interval = 12 * 3600
+    # Regions that are probed when the country of the account is not known
+    countries = ["cn", "de", "us", "ru", "tw", "sg", "in", "i2"]
+    # Device list of the account is downloaded again when it is older than this in seconds
+    device_list_ttl = 600
+    # Api requests per second and burst size allowed for the account
+    request_rate = 5
+    request_burst = 10
+    # Property requests of the devices of the account that are received in this many seconds are sent together
+    batch_delay = 0.01
+    # Updates of the devices that are polled over the account are aligned to a shared grid with this interval in seconds
+    poll_tick = 1.0
+
+    def __init__(self, username: str, password: str, country: str, base_url: str = None, session: aiohttp.ClientSession = None) -> None:
         self.two_factor_auth_url = None
         self._username = username
         self._password = password
         self._country = country
-        self._session = requests.session()
+        # Replaces the account and api hosts, used for testing against a local stand-in of the cloud
+        self._base_url = base_url.rstrip("/") if base_url else None
+        # Pooled client session, cookies are sent with every request explicitly so it must not store them
+        self._session = session
+        self._session_owner = session is None
+        self._cookies = {}
         self._sign = None
         self._ssecurity = None
         self._userId = None
@@ -52,55 +410,142 @@ class XiaomiAirPurifierCloudProtocol:
         self._location = None
         self._code = None
         self._serviceToken = None
+        self._device_id = None
+        self._token_time: float = 0  # Issue time of the service token
+        self._refresh_task: asyncio.Task = None
+        self._login_lock = asyncio.Lock()
+        # Device list of every country indexed by mac and did, with its download time
+        self._devices: dict[str, dict[str, dict[str, Any]]] = {}
+        self._devices_time: dict[str, float] = {}
+        self._devices_locks: dict[str, asyncio.Lock] = {}
+        # Pending batchdevicedatas entries of all devices of the account
+        self._batch: list[tuple[str, list[str], asyncio.Future]] = []
+        self._batch_timer: asyncio.TimerHandle = None
+        self._batch_tasks: set[asyncio.Task] = set()
+        self._key: tuple = None  # Registry key of the shared session
+        self._references = 0
         self._logged_in = None
-        self.user_id = None
-        self.device_id = None
         self.two_factor_url = None
-        self._useragent = f"Android-7.1.1-1.0.0-ONEPLUS A3010-136-{XiaomiAirPurifierCloudProtocol.get_random_agent_id()} APP/xiaomi.smarthome APPV/62830"
+        self._useragent = f"Android-7.1.1-1.0.0-ONEPLUS A3010-136-{XiaomiAirPurifierCloudSession.get_random_agent_id()} APP/xiaomi.smarthome APPV/62830"
         self._locale = locale.getdefaultlocale()[0]
         
-        self._fail_count = 0
         self._connected = False
+        # Pacing and failure handling of the api requests of all devices of the account
+        self._rate_limiter = XiaomiAirPurifierRateLimiter(self.request_rate, self.request_burst)
+        self._circuit_breaker = XiaomiAirPurifierCircuitBreaker()
 
         timezone = datetime.datetime.now(tzlocal.get_localzone()).strftime("%z")
         timezone = "GMT{0}:{1}".format(timezone[:-2], timezone[-2:])
         self._timezone = timezone
 
-    def _api_call(self, url, params):
-        return self.request(f"{self.get_api_url()}/{url}", {"data": json.dumps(params, separators=(",", ":"))})
+    @classmethod
+    def acquire(
+        cls, username: str, password: str, country: str, base_url: str = None, session: aiohttp.ClientSession = None
+    ) -> XiaomiAirPurifierCloudSession:
+        """Return the shared session of the account, creating it when this is the first reference."""
+        key = (username, hashlib.sha256(str.encode(password)).hexdigest(), country, base_url)
+        instance = cls._instances.get(key)
+        if instance is None:
+            instance = cls._instances[key] = cls(username, password, country, base_url, session)
+            instance._key = key
+        elif session is not None and (instance._session is None or instance._session.closed):
+            instance._session = session
+            instance._session_owner = False
+        instance._references = instance._references + 1
+        return instance
+
+    async def release(self) -> None:
+        """Drop a reference of the shared session and close it when it is no longer used."""
+        if self._references > 0:
+            self._references = self._references - 1
+        if self._references == 0:
+            if self._key is not None and self._instances.get(self._key) is self:
+                del self._instances[self._key]
+            await self.close()
+
+    @property
+    def country(self) -> str:
+        return self._country
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(cookie_jar=aiohttp.DummyCookieJar())
+            self._session_owner = True
+        return self._session
+
+    async def close(self) -> None:
+        """Close the client session if it is created by the cloud session."""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        if self._session_owner and self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def api_call(self, url, params, country: str = None, priority: bool = False):
+        return await self.request(f"{self.get_api_url(country)}/{url}", {"data": json.dumps(params, separators=(",", ":"))}, priority)
 
     @property
     def logged_in(self) -> bool:
         return self._logged_in
 
+    @property
+    def auth(self) -> dict[str, Any] | None:
+        """Session tokens of the current login for restoring it later without logging in again."""
+        if not self._logged_in:
+            return None
+        return {
+            "user_id": self._userId,
+            "c_user_id": self._cUserId,
+            "service_token": self._serviceToken,
+            "ssecurity": self._ssecurity,
+            "pass_token": self._passToken,
+            "device_id": self._device_id,
+            "issued": self._token_time,
+        }
+
+    def restore(self, auth: dict[str, Any]) -> None:
+        """Reuse the session tokens of a previous login, they are validated by the first api request."""
+        if self._logged_in or not auth or not auth.get("service_token") or not auth.get("ssecurity"):
+            return
+        self._userId = auth.get("user_id")
+        self._cUserId = auth.get("c_user_id")
+        self._serviceToken = auth["service_token"]
+        self._ssecurity = auth["ssecurity"]
+        self._passToken = auth.get("pass_token")
+        self._device_id = auth.get("device_id")
+        self._token_time = auth.get("issued", 0)
+        self._cookies = {"sdkVersion": "3.8.6", "deviceId": self._device_id}
+        self._logged_in = True
+
     @property
     def connected(self) -> bool:
         return self._connected
 
-    def login_step_1(self) -> bool:
-        url = "https://account.xiaomi.com/pass/serviceLogin?sid=xiaomiio&_json=true"
+    async def login_step_1(self) -> bool:
+        url = f"{self.get_account_url()}/pass/serviceLogin?sid=xiaomiio&_json=true"
         headers = {
             "User-Agent": self._useragent,
             "Content-Type": "application/x-www-form-urlencoded",
         }
-        cookies = {"userId": self._username}
+        cookies = {**self._cookies, "userId": self._username}
         try:
-            response = self._session.get(
-                url, headers=headers, cookies=cookies, timeout=2
-            )
+            async with self._get_session().get(
+                url, headers=headers, cookies=cookies, timeout=aiohttp.ClientTimeout(total=2)
+            ) as response:
+                status = response.status
+                text = await response.text()
         except:
-            response = None
+            status = None
         successful = (
-            response is not None
-            and response.status_code == 200
-            and "_sign" in self.to_json(response.text)
+            status == 200
+            and "_sign" in self.to_json(text)
         )
         if successful:
-            self._sign = self.to_json(response.text)["_sign"]
+            self._sign = self.to_json(text)["_sign"]
         return successful
 
-    def login_step_2(self) -> bool:
-        url = "https://account.xiaomi.com/pass/serviceLoginAuth2"
+    async def login_step_2(self) -> bool:
+        url = f"{self.get_account_url()}/pass/serviceLoginAuth2"
         headers = {
             "User-Agent": self._useragent,
             "Content-Type": "application/x-www-form-urlencoded",
@@ -117,14 +562,16 @@ class XiaomiAirPurifierCloudProtocol:
             fields['_sign'] = self._sign
 
         try:
-            response = self._session.post(
-                url, headers=headers, params=fields, timeout=2
-            )
+            async with self._get_session().post(
+                url, headers=headers, params=fields, cookies=self._cookies, timeout=aiohttp.ClientTimeout(total=2)
+            ) as response:
+                status = response.status
+                text = await response.text()
         except:
-            response = None
-        successful = response is not None and response.status_code == 200
+            status = None
+        successful = status == 200
         if successful:
-            json_resp = self.to_json(response.text)
+            json_resp = self.to_json(text)
             successful = (
                 "ssecurity" in json_resp and len(
                     str(json_resp["ssecurity"])) > 4
@@ -141,7 +588,7 @@ class XiaomiAirPurifierCloudProtocol:
                 if "notificationUrl" in json_resp and self.two_factor_url is None:
                     self.two_factor_url = json_resp["notificationUrl"]
                     if self.two_factor_url[:4] != 'http':
-                        self.two_factor_url = f'https://account.xiaomi.com{self.two_factor_url}'    
+                        self.two_factor_url = f'{self.get_account_url()}{self.two_factor_url}'    
                         
                     _LOGGER.error(
                         "Additional authentication required. Open following URL using device that has the same public IP, as your Home Assistant instance: %s ",
@@ -155,57 +602,127 @@ class XiaomiAirPurifierCloudProtocol:
 
         return successful
 
-    def login_step_3(self) -> bool:
+    async def login_step_3(self) -> bool:
+        service_token = await self._get_service_token(self._location)
+        if service_token:
+            self._serviceToken = service_token
+            self._token_time = time.time()
+        return service_token is not None
+
+    async def _get_service_token(self, location: str) -> str | None:
         headers = {
             "User-Agent": self._useragent,
             "Content-Type": "application/x-www-form-urlencoded",
         }
         try:
-            response = self._session.get(
-                self._location, headers=headers, timeout=2)
+            async with self._get_session().get(
+                location, headers=headers, cookies=self._cookies, timeout=aiohttp.ClientTimeout(total=2)
+            ) as response:
+                status = response.status
+                cookies = response.cookies
         except:
-            response = None
-        successful = (
-            response is not None
-            and response.status_code == 200
-            and "serviceToken" in response.cookies
-        )
-        if successful:
-            self._serviceToken = response.cookies.get("serviceToken")
-        return successful
+            status = None
+        if status == 200 and "serviceToken" in cookies:
+            return cookies["serviceToken"].value
+        return None
+
+    async def refresh(self) -> bool:
+        """Renew the service token with the pass token of the last login, without sending the password."""
+        if not self._passToken or not self._userId:
+            return False
+
+        url = f"{self.get_account_url()}/pass/serviceLogin?sid=xiaomiio&_json=true"
+        headers = {
+            "User-Agent": self._useragent,
+            "Content-Type": "application/x-www-form-urlencoded",
+        }
+        cookies = {**self._cookies, "userId": str(self._userId), "passToken": self._passToken}
+        try:
+            async with self._get_session().get(
+                url, headers=headers, cookies=cookies, timeout=aiohttp.ClientTimeout(total=2)
+            ) as response:
+                status = response.status
+                text = await response.text()
+        except:
+            status = None
+        if status != 200:
+            return False
+
+        try:
+            json_resp = self.to_json(text)
+        except ValueError:
+            return False
+        # Account returns the login form with a new _sign when the pass token is no longer valid
+        if json_resp.get("code") != 0 or "location" not in json_resp or len(str(json_resp.get("ssecurity", ""))) <= 4:
+            return False
+
+        service_token = await self._get_service_token(json_resp["location"])
+        if service_token is None:
+            return False
+
+        # Tokens are replaced together so requests in flight are never signed with a mixed session
+        self._ssecurity = json_resp["ssecurity"]
+        self._passToken = json_resp.get("passToken", self._passToken)
+        self._location = json_resp["location"]
+        self._serviceToken = service_token
+        self._token_time = time.time()
+        self._logged_in = True
+        self._connected = True
+        _LOGGER.debug("Service token is renewed")
+        return True
+
+    def _schedule_refresh(self) -> None:
+        """Renew the service token in background without blocking the current request."""
+        if self._refresh_task is None and self._passToken:
+            self._refresh_task = asyncio.get_running_loop().create_task(self._refresh())
+
+    async def _refresh(self) -> None:
+        try:
+            if not await self.refresh():
+                _LOGGER.info("Unable to renew the service token with the pass token")
+        finally:
+            self._refresh_task = None
+
+    async def login(self) -> bool:
+        async with self._login_lock:
+            # Session may be logged in by another device of the account while waiting
+            if self._logged_in:
+                return True
+            return await self._login()
+
+    async def _login(self) -> bool:
+        # Wait for the background renewal instead of logging in with the password at the same time
+        if self._refresh_task is not None:
+            await asyncio.shield(self._refresh_task)
+            if self._logged_in:
+                return True
+
+        # Keep the device id of the previous login, cloud asks for additional authentication for every new one
+        if not self._device_id:
+            self._device_id = XiaomiAirPurifierCloudSession.generate_device_id()
+        self._cookies = {"sdkVersion": "3.8.6", "deviceId": self._device_id}
+
+        if await self.refresh():
+            return True
 
-    def login(self) -> bool:
-        self._session.close()
-        self._session = requests.session()
-        self._device_id = XiaomiAirPurifierCloudProtocol.generate_device_id()
-        self._session.cookies.set(
-            "sdkVersion", "3.8.6", domain="mi.com")
-        self._session.cookies.set(
-            "sdkVersion", "3.8.6", domain="xiaomi.com"
-        )
-        self._session.cookies.set("deviceId", self._device_id, domain="mi.com")
-        self._session.cookies.set(
-            "deviceId", self._device_id, domain="xiaomi.com")
         self._logged_in = (
-            self.login_step_1() and self.login_step_2() and self.login_step_3()
+            await self.login_step_1() and await self.login_step_2() and await self.login_step_3()
         )
         if self._logged_in:
-            self._fail_count = 0
             self._connected = True
         return self._logged_in
 
-    def get_file(self, url: str = "") -> Any:
+    async def get_file(self, url: str = "") -> Any:
         try:
-            response = self._session.get(url, timeout=2)
+            async with self._get_session().get(url, timeout=aiohttp.ClientTimeout(total=2)) as response:
+                if response.status == 200:
+                    return await response.read()
         except Exception as ex:
             _LOGGER.warning("Unable to get file at %s: %s", url, ex)
-            response = None
-        if response is not None and response.status_code == 200:
-            return response.content
         return None
 
-    def get_file_url(self, object_name: str = "") -> Any:
-        api_response = self._api_call("home/getfileurl", {"obj_name": object_name})
+    async def get_file_url(self, object_name: str = "") -> Any:
+        api_response = await self.api_call("home/getfileurl", {"obj_name": object_name})
         _LOGGER.info("Get file url result: %s", api_response)
         if (
             api_response is None
@@ -216,9 +733,9 @@ class XiaomiAirPurifierCloudProtocol:
 
         return api_response
     
-    def get_interim_file_url(self, object_name: str = "") -> Any:
+    async def get_interim_file_url(self, object_name: str = "") -> Any:
         _LOGGER.debug("Get interim file url: %s", object_name)
-        api_response = self._api_call("v2/home/get_interim_file_url", {"obj_name": object_name})
+        api_response = await self.api_call("v2/home/get_interim_file_url", {"obj_name": object_name})
         if (
             api_response is None
             or not api_response.get("result")
@@ -228,73 +745,112 @@ class XiaomiAirPurifierCloudProtocol:
 
         return api_response
         
-    def send(self, method, parameters) -> Any:
-        api_response = self.request(f"{self.get_api_url()}/v2/home/rpc/{self.device_id}", {"data": json.dumps({"method": method, "params": parameters}, separators=(",", ":"))})
-        if api_response is None or "result" not in api_response:
-            return None
-        return api_response["result"]
+    async def get_devices(self, country: str = None) -> Any:
+        if country is None:
+            country = self._country
+        api_response = await self.api_call("home/device_list", {"getVirtualModel":False,"getHuamiDevices":0}, country)
+        if api_response and "result" in api_response and "list" in api_response["result"]:
+            index = {}
+            for device in api_response["result"]["list"]:
+                index[f'mac:{device.get("mac")}'] = device
+                index[f'did:{device.get("did")}'] = device
+            self._devices[country] = index
+            self._devices_time[country] = time.monotonic()
+        return api_response
 
-    def get_device_property(self, key, limit=1, time_start=0, time_end=9999999999):
-        return self.get_device_data(key, "prop", limit, time_start, time_end)
+    async def get_batch_device_datas(self, did: str, props: list[str]) -> dict[str, Any] | None:
+        """Request cloud values of the properties, requests of all devices of the account are aggregated into a single api call."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._batch.append((str(did), props, future))
+        if self._batch_timer is None:
+            self._batch_timer = loop.call_later(self.batch_delay, self._flush_batch)
+        return await future
 
-    def get_device_event(self, key, limit=1, time_start=0, time_end=9999999999):
-        return self.get_device_data(key, "event", limit, time_start, time_end)
+    def _flush_batch(self) -> None:
+        self._batch_timer = None
+        batch = self._batch
+        self._batch = []
+        task = asyncio.get_running_loop().create_task(self._send_batch(batch))
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_tasks.discard)
 
-    def get_device_data(self, key, type, limit=1, time_start=0, time_end=9999999999):
-        api_response = self._api_call("user/get_user_device_data", {
-            "uid": str(self.user_id),
-            "did": str(self.device_id),
-            "time_end": time_end,
-            "time_start": time_start,
-            "limit": limit,
-            "key": key,
-            "type": type,
-        })
-        if api_response is None or "result" not in api_response:
-            return None
+    async def _send_batch(self, batch: list[tuple[str, list[str], asyncio.Future]]) -> None:
+        devices: dict[str, list[str]] = {}
+        for did, props, _ in batch:
+            requested = devices.setdefault(did, [])
+            requested.extend(prop for prop in props if prop not in requested)
 
-        return api_response["result"]
+        try:
+            api_response = await self.api_call(
+                "device/batchdevicedatas", [{"did": did, "props": props} for did, props in devices.items()]
+            )
+        except Exception as ex:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(ex)
+            return
 
-    def get_info(self, mac: str) -> Tuple[Optional[str], Optional[str]]:
-        countries_to_check = ["cn", "de", "us", "ru", "tw", "sg", "in", "i2"]
+        result = api_response.get("result") if api_response else None
+        for did, _, future in batch:
+            if not future.done():
+                future.set_result(None if result is None else result.get(did, {}))
+
+    async def locate_device(self, mac: str = None, did: str = None) -> dict[str, Any] | None:
+        """Find a device of the account, probing all regions concurrently when the country is not known."""
         if self._country is not None:
-            countries_to_check = [self._country]
-        for self._country in countries_to_check:
-            devices = self.get_devices()
-            if devices is None:
-                continue
-            found = list(
-                filter(lambda d: str(d["mac"]) ==
-                       mac, devices["result"]["list"])
-            )
-            if len(found) > 0:
-                self.user_id = found[0]["uid"]
-                self.device_id = found[0]["did"]
-                return found[0]["token"], found[0]["localip"]
-        return None, None
+            return await self.find_device(mac, did)
+
+        tasks = {asyncio.create_task(self.find_device(mac, did, country)): country for country in self.countries}
+        try:
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.cancelled() and task.exception() is None and task.result() is not None:
+                        # Later requests of the account go directly to the resolved region
+                        self._country = tasks[task]
+                        _LOGGER.info("Device found on cloud region: %s", self._country)
+                        return task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+        return None
 
-    def get_devices(self) -> Any:
-        return self._api_call("home/device_list", {"getVirtualModel":False,"getHuamiDevices":0})
+    async def find_device(self, mac: str = None, did: str = None, country: str = None) -> dict[str, Any] | None:
+        """Find a device of the account on cached device list, list is downloaded only when it is expired or the device is missing."""
+        if country is None:
+            country = self._country
+        key = f"mac:{mac}" if mac else f"did:{did}"
+        downloaded = self._devices_time.get(country)
+        device = self._devices.get(country, {}).get(key)
+        if device is not None and time.monotonic() - downloaded < self.device_list_ttl:
+            return device
 
-    def get_batch_device_datas(self, props) -> Any:
-        api_response = self._api_call("device/batchdevicedatas",[{
-            "did": self.device_id,
-            "props": props
-        }])
-        if api_response is None or self.device_id not in api_response:
-            return None
-        return api_response[self.device_id]
+        async with self._devices_locks.setdefault(country, asyncio.Lock()):
+            # List may be downloaded by another device of the account while waiting
+            if self._devices_time.get(country) == downloaded:
+                await self.get_devices(country)
+        return self._devices.get(country, {}).get(key)
 
-    def set_batch_device_datas(self, props) -> Any:
-        api_response = self._api_call("v2/device/batch_set_props", [{
-            "did": self.device_id,
-            "props": props
-        }])
-        if api_response is None or "result" not in api_response:
+    async def request(self, url: str, params: Dict[str, str], priority: bool = False) -> Any:
+        """Send a signed api request. User commands are sent with priority and are not delayed by the polls."""
+        if not self._circuit_breaker.allow():
+            _LOGGER.debug("Request is skipped, circuit is open: %s", url)
             return None
-        return api_response["result"]
+        try:
+            return await self._request(url, params, priority)
+        except asyncio.CancelledError:
+            self._circuit_breaker.release()
+            raise
+        except BaseException:
+            # Unexpected errors are counted as failures, otherwise a half open circuit waits for the probe forever
+            self._request_failed()
+            raise
+
+    async def _request(self, url: str, params: Dict[str, str], priority: bool) -> Any:
+        await self._rate_limiter.acquire(priority)
 
-    def request(self, url: str, params: Dict[str, str]) -> Any:
         headers = {
             'User-Agent': self._useragent,
             'Accept-Encoding': 'identity',
@@ -303,6 +859,7 @@ class XiaomiAirPurifierCloudProtocol:
             'MIOT-ENCRYPT-ALGORITHM': 'ENCRYPT-RC4'
         }
         cookies = {
+            **self._cookies,
             'userId': str(self._userId),
             'yetAnotherServiceToken': self._serviceToken,
             'serviceToken': self._serviceToken,
@@ -313,38 +870,73 @@ class XiaomiAirPurifierCloudProtocol:
             'channel': 'MI_APP_STORE'
         }
         
+        if self._logged_in and time.time() - self._token_time > self.refresh_interval:
+            self._schedule_refresh()
+
         nonce = self.generate_nonce()
         signed_nonce = self.signed_nonce(nonce)
         fields = self.generate_enc_params(
             url, "POST", signed_nonce, nonce, params, self._ssecurity
         )
         try:
-            response = self._session.post(url, headers=headers, cookies=cookies, data=fields, timeout=3)
-            self._fail_count = 0
-            self._connected = True
+            async with self._get_session().post(url, headers=headers, cookies=cookies, data=fields, timeout=aiohttp.ClientTimeout(total=3)) as response:
+                status = response.status
+                text = await response.text()
         except Exception as ex:
             if self._connected:
                 _LOGGER.warning("Error while executing request: %s %s", url, str(ex))
+            self._request_failed()
+            return None
 
-            if self._fail_count == 5:
-                self._connected = False
-            else:
-                self._fail_count = self._fail_count + 1
+        if status == 429 or status >= 500:
+            # Throttled or server error, counted as failure like connection errors
+            _LOGGER.warning("Execute api call failed with status %s: %s", status, text)
+            self._request_failed()
             return None
 
-        if response is not None:
-            if response.status_code == 200:
-                decoded = self.decrypt_rc4(
-                    self.signed_nonce(fields["_nonce"]), response.text
-                )
-                return json.loads(decoded)
-            _LOGGER.warn("Execute api call failed with response: %s", response.text())
+        if status == 200:
+            try:
+                # Signed nonce of the request is used, ssecurity may be renewed while the request is in flight
+                result = json.loads(self.decrypt_rc4(signed_nonce, text))
+            except ValueError as ex:
+                _LOGGER.warning("Unable to decode the response of api call: %s %s", url, str(ex))
+                self._request_failed()
+                return None
+            self._circuit_breaker.success()
+            self._connected = True
+            return result
+
+        self._circuit_breaker.success()
+        self._connected = True
+        if status == 401:
+            # Service token is expired or revoked, it is not a connection failure. Token is renewed in background
+            # and next update logs in again with the password only if that fails.
+            _LOGGER.info("Service token rejected by the cloud: %s", text)
+            if cookies["serviceToken"] == self._serviceToken:
+                self._logged_in = False
+                self._schedule_refresh()
+            return None
+        _LOGGER.warning("Execute api call failed with response: %s", text)
         return None
 
-    def get_api_url(self) -> str:
+    def _request_failed(self) -> None:
+        self._circuit_breaker.failure()
+        if self._circuit_breaker.state == XiaomiAirPurifierCircuitBreaker.OPEN:
+            self._connected = False
+
+    def get_account_url(self) -> str:
+        if self._base_url:
+            return self._base_url
+        return "https://account.xiaomi.com"
+
+    def get_api_url(self, country: str = None) -> str:
+        if country is None:
+            country = self._country
+        if self._base_url:
+            return f"{self._base_url}/{country}/app"
         return (
             "https://"
-            + ("" if self._country == "cn" else (self._country + "."))
+            + ("" if country == "cn" else (country + "."))
             + "api.io.mi.com/app"
         )
 
@@ -370,7 +962,7 @@ class XiaomiAirPurifierCloudProtocol:
     def generate_signature(
         url, signed_nonce: str, nonce: str, params: Dict[str, str]
     ) -> str:
-        signature_params = [url.split("com")[1], signed_nonce, nonce]
+        signature_params = ["/app" + XiaomiAirPurifierCloudSession.get_signature_path(url), signed_nonce, nonce]
         for k, v in params.items():
             signature_params.append(f"{k}={v}")
         signature_string = "&".join(signature_params)
@@ -387,7 +979,7 @@ class XiaomiAirPurifierCloudProtocol:
     ) -> str:
         signature_params = [
             str(method).upper(),
-            url.split("com")[1].replace("/app/", "/"),
+            XiaomiAirPurifierCloudSession.get_signature_path(url),
         ]
         for k, v in params.items():
             signature_params.append(f"{k}={v}")
@@ -406,14 +998,14 @@ class XiaomiAirPurifierCloudProtocol:
         params: Dict[str, str],
         ssecurity: str,
     ) -> Dict[str, str]:
-        params["rc4_hash__"] = XiaomiAirPurifierCloudProtocol.generate_enc_signature(
+        params["rc4_hash__"] = XiaomiAirPurifierCloudSession.generate_enc_signature(
             url, method, signed_nonce, params
         )
         for k, v in params.items():
-            params[k] = XiaomiAirPurifierCloudProtocol.encrypt_rc4(signed_nonce, v)
+            params[k] = XiaomiAirPurifierCloudSession.encrypt_rc4(signed_nonce, v)
         params.update(
             {
-                "signature": XiaomiAirPurifierCloudProtocol.generate_enc_signature(
+                "signature": XiaomiAirPurifierCloudSession.generate_enc_signature(
                     url, method, signed_nonce, params
                 ),
                 "ssecurity": ssecurity,
@@ -422,6 +1014,11 @@ class XiaomiAirPurifierCloudProtocol:
         )
         return params
 
+    @staticmethod
+    def get_signature_path(url: str) -> str:
+        """Path of the api call without the api prefix."""
+        return "/" + urlparse(url).path.split("/app/", 1)[1]
+
     @staticmethod
     def to_json(response_text: str) -> Any:
         return json.loads(response_text.replace("&&&START&&&", ""))
@@ -444,7 +1041,169 @@ class XiaomiAirPurifierCloudProtocol:
         result_str = "".join(random.choice(letters) for i in range(13))
         return result_str
 
+class XiaomiAirPurifierCloudProtocol:
+    """Cloud api of a single device over the shared session of its account."""
+
+    def __init__(self, username: str, password: str, country: str, base_url: str = None, session: aiohttp.ClientSession = None) -> None:
+        self._cloud = XiaomiAirPurifierCloudSession.acquire(username, password, country, base_url, session)
+        self._released = False
+        self.user_id = None
+        self.device_id = None
+
+    @property
+    def logged_in(self) -> bool:
+        return self._cloud.logged_in
+
+    @property
+    def poll_group(self) -> XiaomiAirPurifierCloudSession:
+        """Shared session of the account, updates of its devices are aligned so their polls are sent together."""
+        return self._cloud
+
+    @property
+    def connected(self) -> bool:
+        # Session is shared by the devices of the account, each device is connected after it is found on the device list
+        return self._cloud.connected and self.device_id is not None
+
+    @property
+    def two_factor_url(self) -> str | None:
+        return self._cloud.two_factor_url
+
+    @property
+    def auth(self) -> dict[str, Any] | None:
+        return self._cloud.auth
+
+    def restore(self, auth: dict[str, Any]) -> None:
+        self._cloud.restore(auth)
+
+    async def login(self) -> bool:
+        return await self._cloud.login()
+
+    async def close(self) -> None:
+        """Release the shared session, it is closed with its last device."""
+        if not self._released:
+            self._released = True
+            await self._cloud.release()
+
+    async def get_devices(self) -> Any:
+        return await self._cloud.get_devices()
+
+    async def send(self, method, parameters) -> Any:
+        # Everything except polling is a user command
+        api_response = await self._cloud.request(
+            f"{self._cloud.get_api_url()}/v2/home/rpc/{self.device_id}",
+            {"data": json.dumps({"method": method, "params": parameters}, separators=(",", ":"))},
+            method != "get_properties",
+        )
+        if api_response is None or "result" not in api_response:
+            return None
+        return api_response["result"]
+
+    async def get_device_property(self, key, limit=1, time_start=0, time_end=9999999999):
+        return await self.get_device_data(key, "prop", limit, time_start, time_end)
+
+    async def get_device_event(self, key, limit=1, time_start=0, time_end=9999999999):
+        return await self.get_device_data(key, "event", limit, time_start, time_end)
+
+    async def get_device_data(self, key, type, limit=1, time_start=0, time_end=9999999999):
+        api_response = await self._cloud.api_call("user/get_user_device_data", {
+            "uid": str(self.user_id),
+            "did": str(self.device_id),
+            "time_end": time_end,
+            "time_start": time_start,
+            "limit": limit,
+            "key": key,
+            "type": type,
+        })
+        if api_response is None or "result" not in api_response:
+            return None
+
+        return api_response["result"]
+
+    async def get_info(self, mac: str) -> Tuple[Optional[str], Optional[str]]:
+        device = await self._cloud.locate_device(mac=mac)
+        if device is not None:
+            self.user_id = device["uid"]
+            self.device_id = device["did"]
+            return device["token"], device["localip"]
+        return None, None
+
+    async def get_batch_device_datas(self, props) -> Any:
+        return await self._cloud.get_batch_device_datas(self.device_id, props)
+
+    async def get_properties(self, parameters) -> Any:
+        """Get MIoT properties in the format of the get_properties rpc result.
+
+        Values are the ones the device last reported to the cloud. Devices report their properties when they change,
+        so a value can be older than the rpc result when the device missed a report. Properties that are not reported
+        yet are requested from the device with the rpc. Returns None when they cannot be requested."""
+        keys = [f'prop.{param["siid"]}.{param["piid"]}' for param in parameters]
+        values = await self.get_batch_device_datas(keys)
+        if values is None:
+            return None
+
+        result = []
+        missing = []
+        for key, param in zip(keys, parameters):
+            if values.get(key) is not None:
+                result.append({"did": param["did"], "siid": param["siid"], "piid": param["piid"], "code": 0, "value": values[key]})
+            else:
+                missing.append(param)
+
+        if missing:
+            response = await self.send("get_properties", missing)
+            if not isinstance(response, list):
+                return None
+            result.extend(response)
+        return result
+
+    async def set_batch_device_datas(self, props) -> Any:
+        api_response = await self._cloud.api_call("v2/device/batch_set_props", [{
+            "did": self.device_id,
+            "props": props
+        }], priority=True)
+        if api_response is None or "result" not in api_response:
+            return None
+        return api_response["result"]
+
+class XiaomiAirPurifierRouteStats:
+    """Rolling latency and failure rate of a request path."""
+
+    def __init__(self, smoothing: float = 0.3) -> None:
+        self.smoothing = smoothing  # Weight of the latest request
+        self.latency: float = None  # Average latency of the successful requests in seconds
+        self.failure_rate: float = 0  # Average of the request results, 1 is failed
+        self.updated: float = 0  # Time of the latest sample
+
+    def record(self, latency: float = None) -> None:
+        """Add the result of a request, None latency means the request is failed."""
+        failed = latency is None
+        self.failure_rate = self.failure_rate + self.smoothing * ((1 if failed else 0) - self.failure_rate)
+        if not failed:
+            self.latency = latency if self.latency is None else self.latency + self.smoothing * (latency - self.latency)
+        self.updated = time.monotonic()
+
+    @property
+    def degraded(self) -> bool:
+        return self.failure_rate >= 0.5
+
+    @property
+    def score(self) -> float:
+        """Expected cost of a request, failures are weighted as slow requests."""
+        return (self.latency if self.latency is not None else 0.5) * (1 + 4 * self.failure_rate)
+
+
 class XiaomiAirPurifierProtocol:
+    # Degraded path that is not used is probed in background with this interval in seconds
+    probe_interval = 30
+    # Secondary path is used when the primary path is this many times slower
+    latency_factor = 3
+    # Requests that can be sent again over the other path when the reply of the first one is lost
+    idempotent_methods = ("miIO.info", "get_properties", "set_properties")
+    # Delay of the hedged cloud write in seconds until the local latency is learned
+    hedge_delay = 0.5
+    # Hedged cloud write is sent when the local reply is slower than this percentile of the recent local latencies
+    hedge_percentile = 0.95
+
     def __init__(
         self,
         ip: str = None,
@@ -453,10 +1212,22 @@ class XiaomiAirPurifierProtocol:
         password: str = None,
         country: str = None,
         prefer_cloud: bool = False,
+        max_in_flight: int = 3,
+        base_url: str = None,
+        session: aiohttp.ClientSession = None,
+        hedge_writes: bool = False,
     ) -> None:
         self.prefer_cloud = prefer_cloud
+        self.hedge_writes = hedge_writes  # Send the user writes also over cloud when the local reply is late
         self._connected = False
         self._mac = None
+        # Limits the number of concurrent requests to the device or cloud
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._login_lock = asyncio.Lock()
+        self._local_stats = XiaomiAirPurifierRouteStats()
+        self._cloud_stats = XiaomiAirPurifierRouteStats()
+        self._probe_task: asyncio.Task = None
+        self._local_latencies: deque[float] = deque(maxlen=50)  # Latencies of the recent successful local requests
 
         if ip and token:
             self.device = XiaomiAirPurifierDeviceProtocol(ip, token)
@@ -465,12 +1236,13 @@ class XiaomiAirPurifierProtocol:
             self.device = None
 
         if username and password and country:
-            self.cloud = XiaomiAirPurifierCloudProtocol(username, password, country)
+            self.cloud = XiaomiAirPurifierCloudProtocol(username, password, country, base_url, session)
         else:
             self.prefer_cloud = False
             self.cloud = None
 
-        self.device_cloud = XiaomiAirPurifierCloudProtocol(username, password, country) if prefer_cloud else None
+        # Both cloud protocols use the shared session of the account. Device cloud is also the fallback path of the local requests
+        self.device_cloud = XiaomiAirPurifierCloudProtocol(username, password, country, base_url, session) if self.cloud else None
 
     def set_credentials(self, ip: str, token: str, mac: str = None):
         self._mac = mac;
@@ -482,56 +1254,233 @@ class XiaomiAirPurifierProtocol:
         else:
             self.device =  None
          
-    def connect(self, retry_count=1) -> Any:
-        response = self.send("miIO.info", retry_count=retry_count)
-        if (self.prefer_cloud or not self.device) and self.device_cloud and response:
-            self._connected = True
+    @property
+    def auth(self) -> dict[str, Any] | None:
+        """Session tokens of the cloud login."""
+        if self.cloud:
+            return self.cloud.auth
+        return None
+
+    def restore(self, auth: dict[str, Any]) -> None:
+        """Reuse the session tokens of a previous cloud login."""
+        if self.cloud:
+            self.cloud.restore(auth)
+
+    async def connect(self, retry_count=1) -> Any:
+        return await self.send("miIO.info", retry_count=retry_count)
+
+    async def disconnect(self) -> None:
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            self._probe_task = None
+        if self.device:
+            self.device.close()
+        if self.cloud:
+            await self.cloud.close()
+        if self.device_cloud:
+            await self.device_cloud.close()
+
+    async def send(self, method, parameters: Any = None, retry_count: int = 1) -> Any:
+        async with self._in_flight:
+            return await self._send(method, parameters, retry_count)
+
+    async def _send(self, method, parameters: Any = None, retry_count: int = 1) -> Any:
+        return await self._route(
+            lambda retries: self.device.send(method, parameters=parameters, retry_count=retries),
+            lambda: self.device_cloud.send(method, parameters=parameters),
+            retry_count,
+            method in self.idempotent_methods,
+        )
+
+    async def _route(
+        self,
+        local: Callable[[int], Awaitable[Any]],
+        cloud: Callable[[], Awaitable[Any]],
+        retry_count: int,
+        idempotent: bool,
+        failover: Callable[[], Awaitable[Any]] = None,
+    ) -> Any:
+        """Send the request over the healthier path and fail over to the other one when the local request times out.
+
+        Failover request is sent instead of the cloud request when the local request fails, when it is given."""
+        use_cloud = self._use_cloud
+        self._probe(not use_cloud)
+        if use_cloud:
+            return await self._send_cloud(cloud, retry_count)
+
+        if not self.device:
+            return None
+
+        can_failover = idempotent and self.device_cloud is not None
+        local_retry_count = retry_count
+        if can_failover:
+            # Single lost datagram is retried locally instead of using the cloud quota, also when the caller does not retry,
+            # local request is only not retried when the local path is already degraded
+            local_retry_count = 0 if self._local_stats.degraded else 1
+        try:
+            return await self._send_local(local, local_retry_count)
+        except DeviceNoResponseException:
+            # Only unanswered requests fail over, error replies of the device are returned to the caller
+            if not can_failover:
+                raise
+            _LOGGER.debug("Local request failed, failing over to cloud")
+            return await self._send_cloud(failover or cloud, retry_count)
+
+    async def _send_local(self, request: Callable[[int], Awaitable[Any]], retry_count: int) -> Any:
+        start = time.monotonic()
+        try:
+            response = await request(retry_count)
+        except DeviceNoResponseException:
+            self._local_stats.record()
+            raise
+        except DeviceException:
+            # Device answered with an error, the path is working
+            self._local_stats.record(time.monotonic() - start)
+            raise
+        latency = time.monotonic() - start
+        self._local_stats.record(latency)
+        self._local_latencies.append(latency)
         return response
 
-    def send(self, method, parameters: Any = None, retry_count: int = 1) -> Any:
-        if (self.prefer_cloud or not self.device) and self.device_cloud:
-            if not self.device_cloud.logged_in:
-                # Use different session for device cloud
-                self.device_cloud.login()
+    async def _send_hedged(
+        self,
+        local: Callable[[int], Awaitable[Any]],
+        cloud: Callable[[], Awaitable[Any]],
+        retry_count: int,
+    ) -> Any:
+        """Send an idempotent write over local and send it again over cloud when the local reply is late.
+
+        First successful reply is returned and the other request is cancelled."""
+        loop = asyncio.get_running_loop()
+        local_task = loop.create_task(self._send_local(local, retry_count))
+        cloud_task = None
+        pending = {local_task}
+        error = None
+        try:
+            await asyncio.wait(pending, timeout=self._hedge_delay)
+            while True:
+                if local_task.done() and local_task.exception() is not None and not isinstance(
+                    local_task.exception(), DeviceNoResponseException
+                ):
+                    # Write is refused by the device, it is not sent again over cloud
+                    raise local_task.exception()
+                if not local_task.done() or local_task.exception() is not None:
+                    if cloud_task is None:
+                        _LOGGER.debug("Local write is late, sending it also over cloud")
+                        cloud_task = loop.create_task(self._send_cloud(cloud, retry_count))
+                        pending.add(cloud_task)
+
+                for task in [task for task in pending if task.done()]:
+                    pending.discard(task)
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+
+                if not pending:
+                    raise error
+                await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @property
+    def _hedge_delay(self) -> float:
+        if len(self._local_latencies) < 10:
+            return self.hedge_delay
+        latencies = sorted(self._local_latencies)
+        return min(max(latencies[int((len(latencies) - 1) * self.hedge_percentile)], 0.05), 1.0)
+
+    def _probe(self, cloud: bool) -> None:
+        """Probe the degraded path in background, so requests fail back to it when it is recovered."""
+        stats = self._cloud_stats if cloud else self._local_stats
+        if (
+            self._probe_task is not None
+            or not stats.degraded
+            or time.monotonic() - stats.updated < self.probe_interval
+            or (self.device_cloud if cloud else self.device) is None
+        ):
+            return
+
+        self._probe_task = asyncio.get_running_loop().create_task(self._send_probe(cloud))
+
+    async def _send_probe(self, cloud: bool) -> None:
+        try:
+            if cloud:
+                await self._send_cloud(lambda: self.device_cloud.send("miIO.info", None), 0)
+            else:
+                start = time.monotonic()
+                try:
+                    await self.device.send("miIO.info", retry_count=0)
+                except DeviceNoResponseException:
+                    self._local_stats.record()
+                except DeviceException:
+                    # Device answered with an error, the path is recovered
+                    self._local_stats.record(time.monotonic() - start)
+                else:
+                    self._local_stats.record(time.monotonic() - start)
+        except DeviceException as ex:
+            _LOGGER.debug("Probe failed: %s", ex)
+        finally:
+            self._probe_task = None
+
+    async def _send_cloud(self, request: Callable[[], Awaitable[Any]], retry_count: int = 1) -> Any:
+        async with self._login_lock:
+            if not self.device_cloud.logged_in or not self.device_cloud.device_id:
+                if not self.device_cloud.logged_in:
+                    await self.device_cloud.login()
                 if self.device_cloud.logged_in and not self.device_cloud.device_id:
                     if self.cloud.device_id:
                         self.device_cloud.device_id = self.cloud.device_id
                     elif self._mac:
-                        self.device_cloud.get_info(self._mac)
+                        await self.device_cloud.get_info(self._mac)
 
+        if not self.device_cloud.logged_in:
+            self._cloud_stats.record()
+            raise DeviceException("Unable to login to device over cloud")
+
+        response = None
+        for i in range(retry_count + 1):
+            start = time.monotonic()
+            response = await request()
+            self._cloud_stats.record(time.monotonic() - start if response is not None else None)
+            if response is not None:
+                break
             if not self.device_cloud.logged_in:
-                raise DeviceException("Unable to login to device over cloud")
-            
-            response = None
-            for i in range(retry_count + 1):
-                response = self.device_cloud.send(method, parameters=parameters)
-                if response is not None:
-                    break
-
-            if response is None:
-                self._connected = False
-                raise DeviceException("Unable to discover the device over cloud") from None
-            self._connected = True
-            return response
+                # Token is rejected, retry after it is renewed
+                async with self._login_lock:
+                    if not self.device_cloud.logged_in and not await self.device_cloud.login():
+                        break
 
-        if self.device:
-            return self.device.send(method, parameters=parameters, retry_count=retry_count)
+        if response is None:
+            self._connected = False
+            raise DeviceException("Unable to discover the device over cloud") from None
+        self._connected = True
+        return response
 
-    def get_properties(
+    async def get_properties(
         self,
         parameters: Any = None,
         retry_count: int = 1
     ) -> Any:
-        return self.send("get_properties", parameters=parameters, retry_count=retry_count)
+        async with self._in_flight:
+            return await self._route(
+                lambda retries: self.device.send("get_properties", parameters=parameters, retry_count=retries),
+                # Cloud values of the properties are requested together with the other devices of the account
+                lambda: self.device_cloud.get_properties(parameters),
+                retry_count,
+                True,
+                # Local values are expected on failover, reported values may be older than the ones on the device
+                lambda: self.device_cloud.send("get_properties", parameters),
+            )
     
-    def set_property(
+    async def set_property(
         self,
         siid: int,
         piid: int,
         value: Any = None,
         retry_count: int = 1
     ) -> Any:
-        return self.set_properties([{
+        return await self.set_properties([{
                 "did": f'{siid}.{piid}',
                 "siid": siid,
                 "piid": piid,
@@ -539,14 +1488,21 @@ class XiaomiAirPurifierProtocol:
             }
         ], retry_count=retry_count)
 
-    def set_properties(
+    async def set_properties(
         self,
         parameters: Any = None,
         retry_count: int = 1
     ) -> Any:
-        return self.send("set_properties", parameters=parameters, retry_count=retry_count)
+        if self.hedge_writes and self.device and self.device_cloud and not self._use_cloud:
+            async with self._in_flight:
+                return await self._send_hedged(
+                    lambda retries: self.device.send("set_properties", parameters=parameters, retry_count=retries),
+                    lambda: self.device_cloud.send("set_properties", parameters=parameters),
+                    retry_count,
+                )
+        return await self.send("set_properties", parameters=parameters, retry_count=retry_count)
 
-    def action(
+    async def action(
         self,
         siid: int,
         aiid: int,
@@ -556,7 +1512,7 @@ class XiaomiAirPurifierProtocol:
         if parameters is None:
             parameters = []
 
-        return self.send(
+        return await self.send(
             "action",
             parameters={
                 "did": f'{siid}.{aiid}',
@@ -567,12 +1523,44 @@ class XiaomiAirPurifierProtocol:
             retry_count=retry_count,
         )
 
+    @property
+    def local_connected(self) -> bool:
+        """Device is connected over the local network."""
+        return bool(self.device and self.device.connected)
+
+    @property
+    def poll_group(self) -> XiaomiAirPurifierCloudSession | None:
+        """Account session of the device when it is polled over cloud."""
+        return self.device_cloud.poll_group if self._use_cloud else None
+
+    @property
+    def _use_cloud(self) -> bool:
+        """Select the path of the next request from the preferred one and the health of both paths."""
+        if not self.device_cloud:
+            return False
+        if not self.device:
+            return True
+
+        if self.prefer_cloud:
+            primary, secondary = self._cloud_stats, self._local_stats
+        else:
+            primary, secondary = self._local_stats, self._cloud_stats
+        use_secondary = (
+            primary.degraded and not secondary.degraded
+        ) or (
+            not secondary.degraded
+            and secondary.latency is not None
+            and primary.latency is not None
+            and primary.score > secondary.score * self.latency_factor
+        )
+        return self.prefer_cloud != use_secondary
+
     @property
     def connected(self) -> bool:
-        if (self.prefer_cloud or not self.device) and self.device_cloud:
-            return self.device_cloud.logged_in and self._connected
+        if self.device and self.device.connected:
+            return True
 
-        if self.device:
-            return self.device.connected
+        if self.device_cloud:
+            return bool(self.device_cloud.logged_in and self._connected)
 
-        return False
+        return False
\ No newline at end of file
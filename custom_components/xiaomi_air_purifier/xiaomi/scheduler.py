@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import math
+import weakref
+from typing import Any, Awaitable, Callable
+
+
+class XiaomiAirPurifierUpdateScheduler:
+    """Single event loop timer shared by all devices for scheduling their updates."""
+
+    # Schedulers are dropped with their event loops, they only reference the loop weakly while idle
+    _instances: weakref.WeakKeyDictionary[
+        asyncio.AbstractEventLoop, XiaomiAirPurifierUpdateScheduler
+    ] = weakref.WeakKeyDictionary()
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop: asyncio.AbstractEventLoop = weakref.proxy(loop)
+        self._deadlines: dict[Any, float] = {}  # Current deadline of every registered key
+        self._callbacks: dict[Any, Callable[[], Awaitable[None]]] = {}
+        # Deadline heap, superseded entries are skipped when they are popped
+        self._heap: list[tuple[float, int, Any]] = []
+        self._counter = itertools.count()
+        self._timer: asyncio.TimerHandle = None
+        self._timer_deadline: float = None
+        self._tasks: set[asyncio.Task] = set()
+        # Grid origin of every group, deadlines of a group are aligned to its grid
+        self._phases: weakref.WeakKeyDictionary[Any, float] = weakref.WeakKeyDictionary()
+        self._groups: dict[Any, Any] = {}  # Group of the keys that have a grouped deadline
+
+    @classmethod
+    def get(cls, loop: asyncio.AbstractEventLoop) -> XiaomiAirPurifierUpdateScheduler:
+        """Return the shared scheduler of the event loop."""
+        if loop not in cls._instances:
+            cls._instances[loop] = cls(loop)
+        return cls._instances[loop]
+
+    def schedule(
+        self,
+        key: Any,
+        wait: float,
+        callback: Callable[[], Awaitable[None]],
+        group: Any = None,
+        tick: float = 0,
+    ) -> None:
+        """Set the deadline of the key, replacing the previous one.
+
+        When a group is given, the key joins a pending deadline of the group that is at most half of the wait earlier,
+        otherwise the deadline is delayed to the next tick of the group, so keys of the same group run together."""
+        deadline = self._loop.time() + wait
+        self._groups.pop(key, None)
+        if group is not None and tick > 0:
+            pending = [
+                other_deadline
+                for other, other_deadline in self._deadlines.items()
+                if self._groups.get(other) is group and deadline - wait / 2 <= other_deadline <= deadline
+            ]
+            if pending:
+                deadline = max(pending)
+            else:
+                phase = self._phases.setdefault(group, deadline)
+                deadline = phase + max(0, math.ceil((deadline - phase) / tick - 1e-6)) * tick
+            self._groups[key] = group
+        self._deadlines[key] = deadline
+        self._callbacks[key] = callback
+        heapq.heappush(self._heap, (deadline, next(self._counter), key))
+
+        if len(self._heap) > 4 * len(self._deadlines) + 16:
+            self._compact()
+
+        if self._timer_deadline is None or deadline < self._timer_deadline:
+            self._arm(deadline)
+
+    def cancel(self, key: Any) -> None:
+        """Remove the key from the schedule."""
+        self._deadlines.pop(key, None)
+        self._callbacks.pop(key, None)
+        self._groups.pop(key, None)
+        if not self._deadlines and self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+            self._timer_deadline = None
+            self._heap = []
+
+    def _compact(self) -> None:
+        """Drop superseded heap entries."""
+        self._heap = [entry for entry in self._heap if self._deadlines.get(entry[2]) == entry[0]]
+        heapq.heapify(self._heap)
+
+    def _arm(self, deadline: float) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer_deadline = deadline
+        self._timer = self._loop.call_at(deadline, self._run)
+
+    def _run(self) -> None:
+        """Run the callbacks of all due keys and arm the timer for the next deadline."""
+        self._timer = None
+        self._timer_deadline = None
+        now = self._loop.time()
+        while self._heap and self._heap[0][0] <= now:
+            deadline, _, key = heapq.heappop(self._heap)
+            if self._deadlines.get(key) != deadline:
+                continue
+            del self._deadlines[key]
+            self._groups.pop(key, None)
+            callback = self._callbacks.pop(key)
+            task = self._loop.create_task(callback())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        while self._heap and self._deadlines.get(self._heap[0][2]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+        if self._heap:
+            self._arm(self._heap[0][0])
+
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import math
-from typing import Any, Dict, Final, List, Optional
+from typing import Any, Callable, Dict, Final, List, Optional
 from enum import IntEnum, Enum
 from dataclasses import dataclass, field
 from datetime import datetime
@@ -217,6 +217,59 @@ ACTION_AVAILABILITY: Final = {
 }
 
 
+@dataclass(frozen=True)
+class XiaomiAirPurifierPollRule:
+    """Polling rule of a property."""
+
+    group: str  # Properties of the same group are requested again together after a change
+    interval: float = 0  # Minimum time between two requests of the property in seconds, 0 is every update
+    priority: int = 0  # Properties with higher priority are requested first
+    condition: Optional[Callable[[Any], bool]] = None  # Property is only requested when the device is in this state
+    required: bool = False  # Property is used by the device status and requested even when no entity is subscribed to it
+
+
+POLL_GROUP_STATUS: Final = "status"
+POLL_GROUP_SETTINGS: Final = "settings"
+POLL_GROUP_TELEMETRY: Final = "telemetry"
+POLL_GROUP_CONSUMABLE: Final = "consumable"
+
+POLL_SCHEDULE: Final = {
+    # Read-only properties
+    XiaomiAirPurifierProperty.FAULT: XiaomiAirPurifierPollRule(POLL_GROUP_STATUS, priority=3, required=True),
+    XiaomiAirPurifierProperty.FAN_LEVEL: XiaomiAirPurifierPollRule(POLL_GROUP_STATUS, priority=3, required=True),
+    XiaomiAirPurifierProperty.PM2_5: XiaomiAirPurifierPollRule(POLL_GROUP_STATUS, priority=3),
+    XiaomiAirPurifierProperty.DOOR_STATUS: XiaomiAirPurifierPollRule(POLL_GROUP_STATUS, priority=3),
+    XiaomiAirPurifierProperty.AIR_QUALITY: XiaomiAirPurifierPollRule(POLL_GROUP_STATUS, priority=3),
+    # Only changed when device is active
+    XiaomiAirPurifierProperty.FAN_SPEED: XiaomiAirPurifierPollRule(POLL_GROUP_STATUS, priority=3, condition=lambda device: device.status.power),
+    XiaomiAirPurifierProperty.FAN_SET_SPEED: XiaomiAirPurifierPollRule(POLL_GROUP_STATUS, priority=3, condition=lambda device: device.status.power),
+    # Read/Write properties
+    XiaomiAirPurifierProperty.POWER: XiaomiAirPurifierPollRule(POLL_GROUP_SETTINGS, 9, 2, required=True),
+    XiaomiAirPurifierProperty.MODE: XiaomiAirPurifierPollRule(POLL_GROUP_SETTINGS, 9, 2, required=True),
+    XiaomiAirPurifierProperty.SCREEN_BRIGHTNESS: XiaomiAirPurifierPollRule(POLL_GROUP_SETTINGS, 9, 2),
+    XiaomiAirPurifierProperty.TEMPERATURE_UNIT: XiaomiAirPurifierPollRule(POLL_GROUP_SETTINGS, 9, 2),
+    XiaomiAirPurifierProperty.MANUAL_FAN_LEVEL: XiaomiAirPurifierPollRule(POLL_GROUP_SETTINGS, 9, 2, required=True),
+    XiaomiAirPurifierProperty.SOUND: XiaomiAirPurifierPollRule(POLL_GROUP_SETTINGS, 9, 2),
+    XiaomiAirPurifierProperty.CHILD_LOCK: XiaomiAirPurifierPollRule(POLL_GROUP_SETTINGS, 9, 2),
+    XiaomiAirPurifierProperty.SPEED: XiaomiAirPurifierPollRule(POLL_GROUP_SETTINGS, 9, 2, required=True),
+    XiaomiAirPurifierProperty.COVERAGE: XiaomiAirPurifierPollRule(POLL_GROUP_SETTINGS, 9, 2, required=True),
+    XiaomiAirPurifierProperty.IONIZER: XiaomiAirPurifierPollRule(POLL_GROUP_SETTINGS, 9, 2),
+    XiaomiAirPurifierProperty.HUMIDITY: XiaomiAirPurifierPollRule(POLL_GROUP_TELEMETRY, 30, 1),
+    XiaomiAirPurifierProperty.TEMPERATURE: XiaomiAirPurifierPollRule(POLL_GROUP_TELEMETRY, 30, 1),
+    XiaomiAirPurifierProperty.AVERAGE_PM2_5: XiaomiAirPurifierPollRule(POLL_GROUP_TELEMETRY, 30, 1),
+    XiaomiAirPurifierProperty.FILTER_USED_TIME: XiaomiAirPurifierPollRule(POLL_GROUP_TELEMETRY, 30, 1),
+    XiaomiAirPurifierProperty.CLEANED_AREA: XiaomiAirPurifierPollRule(POLL_GROUP_TELEMETRY, 30, 1),
+    XiaomiAirPurifierProperty.FILTER_LIFE_LEFT: XiaomiAirPurifierPollRule(POLL_GROUP_CONSUMABLE, 119, required=True),
+    XiaomiAirPurifierProperty.FILTER_LEFT_TIME: XiaomiAirPurifierPollRule(POLL_GROUP_CONSUMABLE, 119),
+    XiaomiAirPurifierProperty.RFID_TAG: XiaomiAirPurifierPollRule(POLL_GROUP_CONSUMABLE, 119),
+    XiaomiAirPurifierProperty.RFID_MANUFACTURER: XiaomiAirPurifierPollRule(POLL_GROUP_CONSUMABLE, 119),
+    XiaomiAirPurifierProperty.RFID_PRODUCT: XiaomiAirPurifierPollRule(POLL_GROUP_CONSUMABLE, 119),
+    XiaomiAirPurifierProperty.RFID_TIME: XiaomiAirPurifierPollRule(POLL_GROUP_CONSUMABLE, 119),
+    XiaomiAirPurifierProperty.RFID_SERIAL: XiaomiAirPurifierPollRule(POLL_GROUP_CONSUMABLE, 119),
+    XiaomiAirPurifierProperty.REBOOT_REASON: XiaomiAirPurifierPollRule(POLL_GROUP_CONSUMABLE, 119),
+}
+
+
 def PIID(property: XiaomiAirPurifierProperty, mapping=XiaomiAirPurifierPropertyMapping) -> int | None:
     if property in mapping:
         return mapping[property]["piid"]
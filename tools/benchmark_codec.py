@@ -0,0 +1,68 @@
+"""Micro benchmark of the built-in miIO packet codec against the python-miio message parser.
+
+Usage: python tools/benchmark_codec.py [iterations]
+"""
+import datetime
+import sys
+import timeit
+
+from common import load_xiaomi
+
+load_xiaomi()
+
+from xiaomi.protocol import XiaomiAirPurifierMessageCodec  # noqa: E402
+from xiaomi.types import XiaomiAirPurifierPropertyMapping  # noqa: E402
+
+TOKEN = bytes.fromhex("00112233445566778899aabbccddeeff")
+DEVICE_ID = 0x1234ABCD
+STAMP = 1700000000
+
+REQUEST = {
+    "id": 1001,
+    "method": "get_properties",
+    "params": [{"did": str(prop.value), **mapping} for prop, mapping in XiaomiAirPurifierPropertyMapping.items()][:15],
+}
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    codec = XiaomiAirPurifierMessageCodec(TOKEN)
+    packet = codec.encode(REQUEST, DEVICE_ID, STAMP)
+    assert codec.decode(packet) == REQUEST
+
+    results = {
+        "built-in encode": timeit.timeit(lambda: codec.encode(REQUEST, DEVICE_ID, STAMP), number=iterations),
+        "built-in decode": timeit.timeit(lambda: codec.decode(packet), number=iterations),
+    }
+
+    try:
+        from miio.protocol import Message
+    except ImportError:
+        Message = None
+        print("python-miio is not installed, skipping comparison")
+
+    if Message is not None:
+        message = {
+            "data": {"value": REQUEST},
+            "header": {"value": {
+                "length": 0,
+                "unknown": 0,
+                "device_id": DEVICE_ID,
+                "ts": datetime.datetime.utcfromtimestamp(STAMP),
+            }},
+            "checksum": 0,
+        }
+        assert Message.build(message, token=TOKEN) == packet, "Wire output differs from python-miio"
+        results["python-miio encode"] = timeit.timeit(lambda: Message.build(message, token=TOKEN), number=iterations)
+        results["python-miio decode"] = timeit.timeit(lambda: Message.parse(packet, token=TOKEN), number=iterations)
+
+    for name, total in results.items():
+        print(f"{name:<20} {total * 1000000 / iterations:8.2f} us/packet")
+
+    if Message is not None:
+        for step in ("encode", "decode"):
+            print(f"{step} speedup: {results[f'python-miio {step}'] / results[f'built-in {step}']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
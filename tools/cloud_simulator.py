@@ -0,0 +1,361 @@
+"""Local stand-in of the Xiaomi cloud for benchmarking the cloud path without an account.
+
+Implements the three step serviceLogin flow, home/device_list, v2/home/rpc/{did}, device/batchdevicedatas
+and user/get_user_device_data with the real RC4 encryption and signature envelope. Devices are backed by
+XiaomiAirPurifierSimulator instances, so rpc calls behave like the local simulator.
+
+Usage:
+    python tools/cloud_simulator.py [--port 8080] [--latency 0.05] [--token-ttl 3600] [--rate-limit 10]
+    python tools/cloud_simulator.py --benchmark 50 [--devices 4] [--request-rate 2.5] [--sequential-setup]
+
+Point XiaomiAirPurifierCloudSession, XiaomiAirPurifierCloudProtocol or XiaomiAirPurifierDevice to the stand-in with base_url="http://127.0.0.1:8080".
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import random
+import secrets
+import statistics
+import time
+from collections import deque
+from typing import Any
+
+from aiohttp import web
+
+from common import load_xiaomi
+from miio_simulator import TOKEN, XiaomiAirPurifierSimulator
+
+load_xiaomi()
+
+from xiaomi.device import XiaomiAirPurifierDevice  # noqa: E402
+from xiaomi.protocol import XiaomiAirPurifierCloudSession  # noqa: E402
+from xiaomi.types import XiaomiAirPurifierProperty, XiaomiAirPurifierPropertyMapping  # noqa: E402
+
+_LOGGER = logging.getLogger(__name__)
+
+USERNAME = "simulator@example.com"
+PASSWORD = "password"
+USER_ID = 1234567890
+REGION = "de"
+
+
+class XiaomiCloudSimulator:
+    """In-process HTTP stand-in of the Xiaomi account and api hosts."""
+
+    def __init__(
+        self,
+        devices: list[XiaomiAirPurifierSimulator],
+        username: str = USERNAME,
+        password: str = PASSWORD,
+        region: str = REGION,
+        latency: float = 0.05,
+        token_ttl: float = None,
+        rate_limit: int = None,
+        history_interval: int = 300,
+    ) -> None:
+        self.username = username
+        self.password = password
+        self.region = region  # Devices are only listed on this region
+        self.latency = latency  # Delay of every response in seconds
+        self.token_ttl = token_ttl  # Service token lifetime in seconds
+        self.rate_limit = rate_limit  # Api requests allowed per second
+        self.history_interval = history_interval  # Interval of the generated property history in seconds
+        self.devices = {str(device.device_id): device for device in devices}
+        self.requests = 0
+        self.logins = 0
+        self.refreshes = 0
+        self.rejected = 0
+        self.base_url: str = None
+        self._ssecurity = base64.b64encode(secrets.token_bytes(16)).decode()
+        self._tokens: dict[str, float] = {}  # Issued service tokens and their issue time
+        self._pass_tokens: set[str] = set()
+        self._recent: deque[float] = deque()
+        self._runner: web.AppRunner = None
+
+        app = web.Application()
+        app.router.add_get("/pass/serviceLogin", self._service_login)
+        app.router.add_post("/pass/serviceLoginAuth2", self._service_login_auth)
+        app.router.add_get("/sts", self._sts)
+        app.router.add_post("/{region}/app/{path:.+}", self._api)
+        self._app = app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving and return the base url."""
+        self._runner = web.AppRunner(self._app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def expire_tokens(self) -> None:
+        """Invalidate all issued service tokens."""
+        self._tokens = {}
+
+    async def _delay(self) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    @staticmethod
+    def _json(data: dict[str, Any]) -> web.Response:
+        return web.Response(text="&&&START&&&" + json.dumps(data), content_type="application/json")
+
+    async def _service_login(self, request: web.Request) -> web.Response:
+        await self._delay()
+        if request.cookies.get("passToken") in self._pass_tokens:
+            # Pass token of a previous login skips the password step
+            self.refreshes = self.refreshes + 1
+            return self._json({
+                "code": 0,
+                "ssecurity": self._ssecurity,
+                "userId": USER_ID,
+                "cUserId": f"c{USER_ID}",
+                "passToken": request.cookies["passToken"],
+                "location": f"{self.base_url}/sts?clientSign={secrets.token_hex(8)}",
+            })
+        return self._json({"_sign": base64.b64encode(secrets.token_bytes(8)).decode(), "code": 70016})
+
+    async def _service_login_auth(self, request: web.Request) -> web.Response:
+        await self._delay()
+        query = request.query
+        if query.get("user") != self.username or query.get("hash") != hashlib.md5(self.password.encode()).hexdigest().upper():
+            return self._json({"code": 70016, "desc": "Invalid credentials"})
+
+        pass_token = secrets.token_hex(16)
+        self._pass_tokens.add(pass_token)
+        self.logins = self.logins + 1
+        return self._json({
+            "code": 0,
+            "ssecurity": self._ssecurity,
+            "userId": USER_ID,
+            "cUserId": f"c{USER_ID}",
+            "passToken": pass_token,
+            "location": f"{self.base_url}/sts?clientSign={secrets.token_hex(8)}",
+        })
+
+    async def _sts(self, request: web.Request) -> web.Response:
+        await self._delay()
+        token = secrets.token_hex(32)
+        self._tokens[token] = time.monotonic()
+        response = web.Response(text="ok")
+        response.set_cookie("serviceToken", token)
+        return response
+
+    def _signed_nonce(self, nonce: str) -> str:
+        return base64.b64encode(
+            hashlib.sha256(base64.b64decode(self._ssecurity) + base64.b64decode(nonce)).digest()
+        ).decode()
+
+    async def _api(self, request: web.Request) -> web.Response:
+        self.requests = self.requests + 1
+        await self._delay()
+
+        if self.rate_limit:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 1:
+                self._recent.popleft()
+            if len(self._recent) >= self.rate_limit:
+                self.rejected = self.rejected + 1
+                return web.Response(status=429, text="too many requests")
+            self._recent.append(now)
+
+        issued = self._tokens.get(request.cookies.get("serviceToken"))
+        if issued is None or (self.token_ttl and time.monotonic() - issued > self.token_ttl):
+            self._tokens.pop(request.cookies.get("serviceToken"), None)
+            return web.Response(status=401, text="auth err")
+
+        form = await request.post()
+        url = str(request.url)
+        signed_nonce = self._signed_nonce(form["_nonce"])
+        encrypted = {"data": form["data"], "rc4_hash__": form["rc4_hash__"]}
+        if form["signature"] != XiaomiAirPurifierCloudSession.generate_enc_signature(url, "POST", signed_nonce, encrypted):
+            return web.Response(status=403, text="invalid signature")
+
+        data = XiaomiAirPurifierCloudSession.decrypt_rc4(signed_nonce, form["data"]).decode()
+        rc4_hash = XiaomiAirPurifierCloudSession.decrypt_rc4(signed_nonce, form["rc4_hash__"]).decode()
+        if rc4_hash != XiaomiAirPurifierCloudSession.generate_enc_signature(url, "POST", signed_nonce, {"data": data}):
+            return web.Response(status=403, text="invalid hash")
+
+        result = self._handle(request.match_info["region"], request.match_info["path"], json.loads(data))
+        return web.Response(text=XiaomiAirPurifierCloudSession.encrypt_rc4(signed_nonce, json.dumps(result)))
+
+    def _handle(self, region: str, path: str, params: Any) -> dict[str, Any]:
+        devices = self.devices if region == self.region else {}
+        if path == "home/device_list":
+            return {"code": 0, "message": "ok", "result": {"list": [self._device_info(device) for device in devices.values()]}}
+
+        if path.startswith("v2/home/rpc/"):
+            device = devices.get(path.split("/")[-1])
+            if device is None:
+                return {"code": -2, "message": "device not found"}
+            response = device._handle(params.get("method"), params.get("params"))
+            device._evolve()
+            if response is None or "result" not in response:
+                return {"code": -2, "message": "device offline"}
+            return {"code": 0, "message": "ok", **response}
+
+        if path == "device/batchdevicedatas":
+            result = {}
+            for entry in params:
+                device = devices.get(str(entry.get("did")))
+                if device is not None:
+                    result[str(entry["did"])] = {prop: self._batch_value(device, prop) for prop in entry.get("props", [])}
+            return {"code": 0, "message": "ok", "result": result}
+
+        if path == "user/get_user_device_data":
+            device = devices.get(str(params.get("did")))
+            if device is None:
+                return {"code": 0, "message": "ok", "result": []}
+            return {"code": 0, "message": "ok", "result": self._history(device, params)}
+
+        return {"code": -8, "message": "unknown api"}
+
+    def _device_info(self, device: XiaomiAirPurifierSimulator) -> dict[str, Any]:
+        info = device.info
+        return {
+            "did": str(device.device_id),
+            "uid": USER_ID,
+            "token": device.token,
+            "name": f"Air Purifier {device.host}",
+            "model": info["model"],
+            "localip": device.host,
+            "mac": info["mac"],
+            "parent_id": "",
+            "isOnline": True,
+        }
+
+    @staticmethod
+    def _batch_value(device: XiaomiAirPurifierSimulator, prop: str) -> Any:
+        # MIoT properties are named as prop.{siid}.{piid}
+        try:
+            _, siid, piid = prop.split(".")
+            result = device._get_property({"did": prop, "siid": int(siid), "piid": int(piid)})
+        except ValueError:
+            return None
+        return result.get("value")
+
+    def _history(self, device: XiaomiAirPurifierSimulator, params: dict[str, Any]) -> list[dict[str, Any]]:
+        """Generate a deterministic random walk history of a property, newest first."""
+        key = str(params.get("key"))
+        prop = next(
+            (prop for prop, mapping in XiaomiAirPurifierPropertyMapping.items() if f'{mapping["siid"]}.{mapping["piid"]}' == key),
+            None,
+        )
+        if prop is None or not isinstance(device.values.get(prop), (int, float)) or isinstance(device.values.get(prop), bool):
+            return []
+
+        interval = self.history_interval
+        time_end = min(int(params.get("time_end", time.time())), int(time.time()))
+        time_start = max(int(params.get("time_start", 0)), time_end - 30 * 86400)
+        limit = int(params.get("limit", 1))
+        result = []
+        timestamp = time_end - time_end % interval
+        while timestamp >= time_start and len(result) < limit:
+            rng = random.Random(f"{device.device_id}-{key}-{timestamp}")
+            value = device.values[prop]
+            value = round(value + rng.uniform(-0.1, 0.1) * (abs(value) + 1), 1) if isinstance(value, float) else max(0, value + rng.randint(-3, 3))
+            result.append({
+                "did": str(device.device_id),
+                "uid": str(USER_ID),
+                "type": params.get("type", "prop"),
+                "key": key,
+                "time": timestamp,
+                "value": json.dumps([value]),
+            })
+            timestamp = timestamp - interval
+        return result
+
+
+async def benchmark(args: argparse.Namespace) -> None:
+    if args.request_rate:
+        XiaomiAirPurifierCloudSession.request_rate = args.request_rate
+        XiaomiAirPurifierCloudSession.request_burst = max(1, int(args.request_rate))
+    simulators = [XiaomiAirPurifierSimulator(f"127.0.0.{index + 1}", TOKEN, latency=0) for index in range(args.devices)]
+    cloud = XiaomiCloudSimulator(simulators, latency=args.latency, token_ttl=args.token_ttl, rate_limit=args.rate_limit)
+    base_url = await cloud.start(port=args.port)
+
+    devices = [
+        XiaomiAirPurifierDevice(
+            f"Cloud Simulator {index + 1}", None, None, simulator.info["mac"], USERNAME, PASSWORD, REGION, True, base_url=base_url
+        )
+        for index, simulator in enumerate(simulators)
+    ]
+    if args.sequential_setup:
+        # Entries of an account are set up one after another, later devices join the session of the first one
+        for device in devices:
+            await device.update()
+    else:
+        await asyncio.gather(*[device.update() for device in devices])
+    for device in devices:
+        # Polls are driven by the benchmark
+        device.schedule_update(-1)
+
+    async def poll(device: XiaomiAirPurifierDevice) -> list[float]:
+        latencies = []
+        for _ in range(args.benchmark):
+            start = time.perf_counter()
+            try:
+                await device._request_properties()
+            except Exception as ex:
+                _LOGGER.debug("Poll failed: %s", ex)
+                continue
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[poll(device) for device in devices])
+    duration = time.perf_counter() - start
+
+    latencies = sorted(latency for result in results for latency in result)
+    polls = args.devices * args.benchmark
+    print(f"devices: {args.devices}, polls: {polls}, failed: {polls - len(latencies)}")
+    if latencies:
+        print(f"latency mean: {statistics.mean(latencies) * 1000:.1f} ms")
+        print(f"latency p50: {latencies[len(latencies) // 2] * 1000:.1f} ms")
+        print(f"latency p95: {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms")
+        print(f"throughput: {len(latencies) / duration:.1f} polls/s")
+    print(f"api requests: {cloud.requests}, logins: {cloud.logins}, refreshes: {cloud.refreshes}, rate limited: {cloud.rejected}")
+
+    for device in devices:
+        await device.disconnect()
+    await cloud.stop()
+
+
+async def serve(args: argparse.Namespace) -> None:
+    simulators = [XiaomiAirPurifierSimulator(f"127.0.0.{index + 1}", TOKEN, latency=0) for index in range(args.devices)]
+    cloud = XiaomiCloudSimulator(simulators, latency=args.latency, token_ttl=args.token_ttl, rate_limit=args.rate_limit)
+    base_url = await cloud.start(port=args.port)
+    print(f"Xiaomi cloud stand-in on {base_url} (username: {USERNAME}, password: {PASSWORD}, country: {REGION})")
+    await asyncio.Event().wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.05, help="response delay in seconds")
+    parser.add_argument("--token-ttl", type=float, default=None, help="service token lifetime in seconds")
+    parser.add_argument("--rate-limit", type=int, default=None, help="api requests allowed per second")
+    parser.add_argument("--request-rate", type=float, default=None, help="client side api request rate of the benchmark")
+    parser.add_argument("--benchmark", type=int, default=0, help="number of polls per device")
+    parser.add_argument("--devices", type=int, default=1, help="number of simulated devices")
+    parser.add_argument("--sequential-setup", action="store_true", help="connect the devices one after another")
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.WARNING)
+    asyncio.run(benchmark(args) if args.benchmark else serve(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+"""Shared helpers of the development tools."""
+import importlib.util
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+XIAOMI_PATH = os.path.join(ROOT, "custom_components", "xiaomi_air_purifier", "xiaomi")
+
+
+def load_xiaomi():
+    """Import the xiaomi package of the integration as a top level package without Home Assistant.
+    Integration directory cannot be added to the path because its platform modules shadow the standard library."""
+    if "xiaomi" not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            "xiaomi", os.path.join(XIAOMI_PATH, "__init__.py"), submodule_search_locations=[XIAOMI_PATH]
+        )
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["xiaomi"] = module
+        spec.loader.exec_module(module)
+    return sys.modules["xiaomi"]
@@ -0,0 +1,444 @@
+"""Local miIO air purifier simulator for benchmarking and reproducing network problems without hardware.
+
+Simulator answers the miIO handshake, miIO.info and MIoT get_properties, set_properties and action
+requests with the siid/piid table of the integration.
+
+Usage:
+    python tools/miio_simulator.py [--host 127.0.0.1] [--latency 0.02] [--jitter 0.01] [--loss 0.05]
+                                   [--unsupported RFID_TAG,COUNTRY_CODE] [--max-batch 20]
+    python tools/miio_simulator.py --benchmark 100 [--devices 4]
+    python tools/miio_simulator.py --check
+
+With --benchmark, simulators are started on 127.0.0.1, 127.0.0.2, ... and XiaomiAirPurifierDevice instances
+poll them for given number of iterations and report latency and throughput.
+
+With --check, regression scenarios of the request routing and polling are run against a simulator and a mocked cloud
+and the process exits with a non-zero status if any of them fails.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import sys
+import time
+from typing import Any
+
+from common import load_xiaomi
+
+load_xiaomi()
+
+from xiaomi.device import XiaomiAirPurifierBatchSize, XiaomiAirPurifierDevice  # noqa: E402
+from xiaomi.exceptions import DeviceException, DeviceNoResponseException  # noqa: E402
+from xiaomi.protocol import XiaomiAirPurifierMessageCodec, XiaomiAirPurifierProtocol  # noqa: E402
+from xiaomi.types import (  # noqa: E402
+    XiaomiAirPurifierAction,
+    XiaomiAirPurifierActionMapping,
+    XiaomiAirPurifierProperty,
+    XiaomiAirPurifierPropertyMapping,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+TOKEN = "00112233445566778899aabbccddeeff"
+MODEL = "zhimi.airp.mb5"
+FIRMWARE_VERSION = "2.1.9_0045"
+SETUP_ATTEMPTS = 3  # Initial updates of a device before it is left out of the benchmark
+
+ERROR_UNSUPPORTED = -4003
+
+INITIAL_VALUES = {
+    XiaomiAirPurifierProperty.POWER: True,
+    XiaomiAirPurifierProperty.FAULT: 0,
+    XiaomiAirPurifierProperty.MODE: 0,
+    XiaomiAirPurifierProperty.FAN_LEVEL: 1,
+    XiaomiAirPurifierProperty.IONIZER: True,
+    XiaomiAirPurifierProperty.HUMIDITY: 45,
+    XiaomiAirPurifierProperty.PM2_5: 12,
+    XiaomiAirPurifierProperty.TEMPERATURE: 22.5,
+    XiaomiAirPurifierProperty.FILTER_LIFE_LEFT: 87,
+    XiaomiAirPurifierProperty.FILTER_USED_TIME: 420,
+    XiaomiAirPurifierProperty.FILTER_LEFT_TIME: 260,
+    XiaomiAirPurifierProperty.SOUND: True,
+    XiaomiAirPurifierProperty.CHILD_LOCK: False,
+    XiaomiAirPurifierProperty.FAN_SPEED: 800,
+    XiaomiAirPurifierProperty.SPEED: 1000,
+    XiaomiAirPurifierProperty.FAN_SET_SPEED: 800,
+    XiaomiAirPurifierProperty.COVERAGE: 12,
+    XiaomiAirPurifierProperty.DOOR_STATUS: 0,
+    XiaomiAirPurifierProperty.REBOOT_REASON: 0,
+    XiaomiAirPurifierProperty.MANUAL_FAN_LEVEL: 1,
+    XiaomiAirPurifierProperty.COUNTRY_CODE: 2,
+    XiaomiAirPurifierProperty.IIC_ERROR_COUNT: 0,
+    XiaomiAirPurifierProperty.FILTER_USE: 1,
+    XiaomiAirPurifierProperty.CLEANED_AREA: 1520,
+    XiaomiAirPurifierProperty.AVERAGE_PM2_5: 10,
+    XiaomiAirPurifierProperty.AIR_QUALITY: 0,
+    XiaomiAirPurifierProperty.AIR_QUALITY_HEARTBEAT: 20,
+    XiaomiAirPurifierProperty.RFID_TAG: "81:6b:3f:32:84:4b:4",
+    XiaomiAirPurifierProperty.RFID_MANUFACTURER: "12.1.01",
+    XiaomiAirPurifierProperty.RFID_PRODUCT: "0:0:30:33",
+    XiaomiAirPurifierProperty.RFID_TIME: "2023-01-01",
+    XiaomiAirPurifierProperty.RFID_SERIAL: "00-00-00-00",
+    XiaomiAirPurifierProperty.SCREEN_BRIGHTNESS: 2,
+    XiaomiAirPurifierProperty.TEMPERATURE_UNIT: 1,
+}
+
+
+class XiaomiAirPurifierSimulator(asyncio.DatagramProtocol):
+    """Simulated air purifier that speaks the miIO protocol over UDP."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        token: str = TOKEN,
+        latency: float = 0.02,
+        jitter: float = 0.0,
+        loss: float = 0.0,
+        unsupported: list[XiaomiAirPurifierProperty] = None,
+        max_batch: int = None,
+    ) -> None:
+        self.host = host
+        self.token = token
+        self.latency = latency  # Reply delay in seconds
+        self.jitter = jitter  # Random delay added to the latency in seconds
+        self.loss = loss  # Probability of dropping a request
+        self.unsupported = set(unsupported or [])  # Properties answered with code -4003
+        self.max_batch = max_batch  # Requests with more properties than this are silently dropped like some firmwares do
+        self.device_id = random.randint(0x10000000, 0x7FFFFFFF)
+        self.values = dict(INITIAL_VALUES)
+        self.requests = 0
+        self.dropped = 0
+        self.drop_next = 0  # Number of the next requests that are dropped regardless of the loss
+        self.steady = False  # Sensor values are not changed between the requests
+        self._codec = XiaomiAirPurifierMessageCodec(bytes.fromhex(token))
+        self._started = time.time() - random.randint(1000, 100000)  # Device uptime is used as the timestamp
+        self._transport: asyncio.DatagramTransport = None
+        self._loop: asyncio.AbstractEventLoop = None
+        self._property_by_id = {
+            (mapping["siid"], mapping["piid"]): prop for prop, mapping in XiaomiAirPurifierPropertyMapping.items()
+        }
+        self._action_by_id = {
+            (mapping["siid"], mapping["aiid"]): action for action, mapping in XiaomiAirPurifierActionMapping.items()
+        }
+
+    async def start(self, port: int = 54321) -> None:
+        self._loop = asyncio.get_running_loop()
+        await self._loop.create_datagram_endpoint(lambda: self, local_addr=(self.host, port))
+
+    def stop(self) -> None:
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def connection_made(self, transport: asyncio.DatagramTransport) -> None:
+        self._transport = transport
+
+    @property
+    def stamp(self) -> int:
+        return int(time.time() - self._started)
+
+    def datagram_received(self, data: bytes, addr: Any) -> None:
+        self.requests = self.requests + 1
+        if self.drop_next:
+            self.drop_next = self.drop_next - 1
+            self.dropped = self.dropped + 1
+            return
+        if self.loss and random.random() < self.loss:
+            self.dropped = self.dropped + 1
+            return
+
+        if len(data) == 32:
+            header = bytearray(32)
+            XiaomiAirPurifierMessageCodec.HEADER.pack_into(header, 0, 0x2131, 32, 0, self.device_id, self.stamp)
+            header[16:32] = b"\xff" * 16
+            self._reply(bytes(header), addr)
+            return
+
+        try:
+            request = self._codec.decode(data)
+        except Exception as ex:
+            _LOGGER.warning("Invalid packet from %s: %s", addr, ex)
+            return
+
+        result = self._handle(request.get("method"), request.get("params"))
+        if result is None:
+            self.dropped = self.dropped + 1
+            return
+
+        self._evolve()
+        self._reply(self._codec.encode({"id": request.get("id"), **result}, self.device_id, self.stamp), addr)
+
+    def _reply(self, packet: bytes, addr: Any) -> None:
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            self._loop.call_later(delay, self._send, packet, addr)
+        else:
+            self._send(packet, addr)
+
+    def _send(self, packet: bytes, addr: Any) -> None:
+        if self._transport is not None:
+            self._transport.sendto(packet, addr)
+
+    def _handle(self, method: str, params: Any) -> dict[str, Any] | None:
+        if method == "miIO.info":
+            return {"result": self.info}
+        if method == "get_properties":
+            if self.max_batch and len(params) > self.max_batch:
+                return None
+            return {"result": [self._get_property(param) for param in params]}
+        if method == "set_properties":
+            return {"result": [self._set_property(param) for param in params]}
+        if method == "action":
+            return {"result": self._action(params)}
+        return {"error": {"code": -32601, "message": "Method not found."}}
+
+    def _get_property(self, param: dict[str, Any]) -> dict[str, Any]:
+        result = {"did": param.get("did"), "siid": param.get("siid"), "piid": param.get("piid")}
+        prop = self._property_by_id.get((param.get("siid"), param.get("piid")))
+        if prop is None or prop in self.unsupported:
+            return {**result, "code": ERROR_UNSUPPORTED}
+        return {**result, "code": 0, "value": self.values[prop]}
+
+    def _set_property(self, param: dict[str, Any]) -> dict[str, Any]:
+        result = {"did": param.get("did"), "siid": param.get("siid"), "piid": param.get("piid")}
+        prop = self._property_by_id.get((param.get("siid"), param.get("piid")))
+        if prop is None or prop in self.unsupported:
+            return {**result, "code": ERROR_UNSUPPORTED}
+        self.values[prop] = param.get("value")
+        if prop is XiaomiAirPurifierProperty.MANUAL_FAN_LEVEL:
+            self.values[XiaomiAirPurifierProperty.FAN_LEVEL] = param.get("value")
+        return {**result, "code": 0}
+
+    def _action(self, params: dict[str, Any]) -> dict[str, Any]:
+        result = {"did": params.get("did"), "siid": params.get("siid"), "aiid": params.get("aiid")}
+        action = self._action_by_id.get((params.get("siid"), params.get("aiid")))
+        if action is None:
+            return {**result, "code": ERROR_UNSUPPORTED}
+
+        values = self.values
+        if action is XiaomiAirPurifierAction.TOGGLE_POWER:
+            values[XiaomiAirPurifierProperty.POWER] = not values[XiaomiAirPurifierProperty.POWER]
+        elif action is XiaomiAirPurifierAction.RESET_FILTER:
+            values[XiaomiAirPurifierProperty.FILTER_LIFE_LEFT] = 100
+            values[XiaomiAirPurifierProperty.FILTER_USED_TIME] = 0
+        elif action is XiaomiAirPurifierAction.TOGGLE_MODE:
+            values[XiaomiAirPurifierProperty.MODE] = (values[XiaomiAirPurifierProperty.MODE] + 1) % 4
+        elif action is XiaomiAirPurifierAction.TOGGLE_FAN_LEVEL:
+            values[XiaomiAirPurifierProperty.FAN_LEVEL] = values[XiaomiAirPurifierProperty.FAN_LEVEL] % 3 + 1
+        return {**result, "code": 0}
+
+    def _evolve(self) -> None:
+        """Random walk of the sensor values."""
+        if self.steady:
+            return
+        values = self.values
+        values[XiaomiAirPurifierProperty.PM2_5] = max(0, values[XiaomiAirPurifierProperty.PM2_5] + random.randint(-2, 2))
+        values[XiaomiAirPurifierProperty.AIR_QUALITY] = min(5, values[XiaomiAirPurifierProperty.PM2_5] // 35)
+        values[XiaomiAirPurifierProperty.HUMIDITY] = min(100, max(0, values[XiaomiAirPurifierProperty.HUMIDITY] + random.choice((-1, 0, 0, 1))))
+        values[XiaomiAirPurifierProperty.TEMPERATURE] = round(values[XiaomiAirPurifierProperty.TEMPERATURE] + random.uniform(-0.1, 0.1), 1)
+        if values[XiaomiAirPurifierProperty.POWER]:
+            target = values[XiaomiAirPurifierProperty.FAN_LEVEL] * 500
+            values[XiaomiAirPurifierProperty.FAN_SPEED] = target + random.randint(-20, 20)
+            values[XiaomiAirPurifierProperty.FAN_SET_SPEED] = target
+        else:
+            values[XiaomiAirPurifierProperty.FAN_SPEED] = 0
+
+    @property
+    def info(self) -> dict[str, Any]:
+        mac = ":".join(f"{b:02X}" for b in self.device_id.to_bytes(4, "big"))
+        return {
+            "model": MODEL,
+            "fw_ver": FIRMWARE_VERSION,
+            "hw_ver": "esp32",
+            "mac": f"64:90:{mac}",
+            "token": self.token,
+            "netif": {"localIp": self.host, "mask": "255.255.255.0", "gw": "127.0.0.1"},
+            "ap": {"ssid": "simulator", "bssid": "00:00:00:00:00:00", "rssi": -50},
+        }
+
+
+async def benchmark(args: argparse.Namespace, unsupported: list[XiaomiAirPurifierProperty]) -> None:
+    simulators = []
+    devices = []
+    for index in range(args.devices):
+        simulator = XiaomiAirPurifierSimulator(
+            f"127.0.0.{index + 1}", TOKEN, args.latency, args.jitter, args.loss, unsupported, args.max_batch
+        )
+        await simulator.start()
+        simulators.append(simulator)
+        devices.append(XiaomiAirPurifierDevice(f"Simulator {index + 1}", simulator.host, TOKEN))
+
+    async def connect(device: XiaomiAirPurifierDevice) -> None:
+        # Initial update is retried like the integration does on setup, so lossy runs can still connect
+        for attempt in range(SETUP_ATTEMPTS):
+            try:
+                await device.update()
+                return
+            except Exception as ex:
+                if attempt == SETUP_ATTEMPTS - 1:
+                    raise
+                _LOGGER.debug("Initial update failed: %s", ex)
+
+    results = await asyncio.gather(*[connect(device) for device in devices], return_exceptions=True)
+    for device, result in zip(list(devices), results):
+        if isinstance(result, Exception):
+            print(f"{device.name} is not connected: {result}")
+            await device.disconnect()
+            devices.remove(device)
+
+    for device in devices:
+        # Polls are driven by the benchmark
+        device.schedule_update(-1)
+
+    async def poll(device: XiaomiAirPurifierDevice) -> list[float]:
+        latencies = []
+        for _ in range(args.benchmark):
+            start = time.perf_counter()
+            try:
+                await device._request_properties()
+            except Exception as ex:
+                _LOGGER.debug("Poll failed: %s", ex)
+                continue
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[poll(device) for device in devices])
+    duration = time.perf_counter() - start
+
+    latencies = sorted(latency for result in results for latency in result)
+    polls = len(devices) * args.benchmark
+    print(f"devices: {len(devices)}, polls: {polls}, failed: {polls - len(latencies)}")
+    if latencies:
+        print(f"latency mean: {statistics.mean(latencies) * 1000:.1f} ms")
+        print(f"latency p50: {latencies[len(latencies) // 2] * 1000:.1f} ms")
+        print(f"latency p95: {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms")
+        print(f"throughput: {len(latencies) / duration:.1f} polls/s")
+    print(f"packets: {sum(simulator.requests for simulator in simulators)}, dropped: {sum(simulator.dropped for simulator in simulators)}")
+
+    for device in devices:
+        await device.disconnect()
+    for simulator in simulators:
+        simulator.stop()
+
+
+async def check(args: argparse.Namespace, unsupported: list[XiaomiAirPurifierProperty]) -> bool:
+    """Run the routing scenarios of a device that can fail over to cloud and the polling scenarios, and report the results."""
+    simulator = XiaomiAirPurifierSimulator(args.host, TOKEN, args.latency, args.jitter, 0, unsupported, args.max_batch)
+    await simulator.start(args.port)
+    protocol = XiaomiAirPurifierProtocol(args.host, TOKEN, "user", "password", "de")
+    cloud_calls = []
+
+    async def send_cloud(request: Any, retry_count: int = 1) -> Any:
+        # Cloud is mocked, only the failovers are recorded
+        cloud_calls.append(request)
+        return None
+
+    protocol._send_cloud = send_cloud
+    properties = [
+        {"did": str(prop.value), **XiaomiAirPurifierPropertyMapping[prop]}
+        for prop in (XiaomiAirPurifierProperty.POWER, XiaomiAirPurifierProperty.PM2_5)
+    ]
+
+    async def single_drop() -> bool:
+        # Polls do not retry, a single lost datagram is still retried locally
+        simulator.drop_next = 1
+        result = await protocol.get_properties(properties, retry_count=0)
+        return result is not None and not cloud_calls
+
+    async def error_reply() -> bool:
+        # Device refuses the request, error is returned to the caller and the local path stays healthy
+        try:
+            await protocol.send("unknown_method", retry_count=0)
+        except DeviceNoResponseException:
+            return False
+        except DeviceException:
+            return not cloud_calls and not protocol._local_stats.degraded
+        return False
+
+    async def batch_growth() -> bool:
+        # Updates are capped to the batch size, the size still grows to the largest batch the device answers
+        device = XiaomiAirPurifierDevice("Check", args.host, TOKEN)
+        max_batch = simulator.max_batch
+        simulator.max_batch = 10
+        XiaomiAirPurifierBatchSize._learned.clear()
+        try:
+            await device.update()
+            device.schedule_update(-1)
+            for _ in range(10):
+                # Every property is due, so each update requests a full batch
+                device._poll_planner._last_request.clear()
+                await device.update()
+        finally:
+            simulator.max_batch = max_batch
+            await device.disconnect()
+        return device._batch_size.confirmed == 10
+
+    async def steady_values() -> bool:
+        # Every answered poll is reported, also when none of the values is changed
+        device = XiaomiAirPurifierDevice("Check", args.host, TOKEN)
+        changes = []
+        polls = []
+        device.listen(lambda: changes.append(time.time()))
+        device.listen_poll(lambda: polls.append(time.time()))
+        simulator.steady = True
+        try:
+            await device.update()
+            device.schedule_update(-1)
+            changes.clear()
+            polls.clear()
+            for _ in range(3):
+                await device.update()
+        finally:
+            simulator.steady = False
+            await device.disconnect()
+        return len(polls) == 3 and not changes
+
+    passed = True
+    try:
+        await protocol.connect()
+        for scenario in (single_drop, error_reply, batch_growth, steady_values):
+            cloud_calls.clear()
+            result = await scenario()
+            passed = passed and result
+            print(f"{scenario.__name__}: {'ok' if result else 'failed'}, cloud calls: {len(cloud_calls)}")
+    finally:
+        await protocol.disconnect()
+        simulator.stop()
+    return passed
+
+
+async def serve(args: argparse.Namespace, unsupported: list[XiaomiAirPurifierProperty]) -> None:
+    simulator = XiaomiAirPurifierSimulator(args.host, TOKEN, args.latency, args.jitter, args.loss, unsupported, args.max_batch)
+    await simulator.start(args.port)
+    print(f"Simulating {MODEL} on {args.host}:{args.port} with token {TOKEN}")
+    await asyncio.Event().wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--latency", type=float, default=0.02, help="reply delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random delay added to the latency in seconds")
+    parser.add_argument("--loss", type=float, default=0.0, help="probability of dropping a request")
+    parser.add_argument("--unsupported", default="", help="comma separated property names answered with code -4003")
+    parser.add_argument("--max-batch", type=int, default=None, help="drop get_properties requests larger than this")
+    parser.add_argument("--benchmark", type=int, default=0, help="number of polls per device")
+    parser.add_argument("--devices", type=int, default=1, help="number of simulated devices for benchmark")
+    parser.add_argument("--check", action="store_true", help="run the regression scenarios and exit")
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.WARNING)
+    unsupported = [XiaomiAirPurifierProperty[name.strip().upper()] for name in args.unsupported.split(",") if name.strip()]
+    if args.check:
+        sys.exit(0 if asyncio.run(check(args, unsupported)) else 1)
+    asyncio.run(benchmark(args, unsupported) if args.benchmark else serve(args, unsupported))
+
+
+if __name__ == "__main__":
+    main()